@@ -1,14 +1,32 @@
 import pygame
 import sys
 import random
+import argparse
+import atexit
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
 
-# Initialize pygame
-pygame.init()
+from capture import FrameCapture
+from content import CONTENT_DIR, default_pack
+from effects import escape_chain, object_chain
+from game_state import GameState
+from profiler import FrameProfiler
+from quality import QUALITY_LEVELS, QUALITY_NAMES, QualityController, quality_level
+from session import LiveInput, SessionRecorder, SessionPlayer
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 # Screen dimensions
 WIDTH, HEIGHT = 1024, 768
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Pixel Escape Room: The Quantum Paradox")
+TITLE = "Pixel Escape Room: The Quantum Paradox"
 
 # Colors
 WHITE = (255, 255, 255)
@@ -23,20 +41,125 @@ DARK_BLUE = (0, 0, 139)
 DARK_GREEN = (0, 100, 0)
 DARK_BROWN = (101, 67, 33)
 
+# Fixed palette for the escape crawl, so rendered lines can be cached
+CRAWL_PALETTE = [(r, g, b) for r in (100, 255) for g in (100, 255) for b in (100, 255)]
+
+# Lion head sprite colors
+LION_COLOR = (200, 150, 100)  # Brownish color
+MANE_COLOR = (150, 100, 50)
+
+# Flickering marks on the painting
+MARK_COLORS = [GREEN, BLUE, RED]
+
+# How far each animated overlay can draw past its object's rect
+OVERLAY_SPILL = {'painting_marks': 20, 'color_noise': 5, 'key_glitch': 10}
+
+# Narrative for the final escape sequence
+ESCAPE_TEXT = [
+    "QUANTUM PARADOX: REALITY UNRAVELED",
+    "",
+    "As the holographic key flickers,",
+    "reality begins to deconstruct.",
+    "",
+    "YOU ARE NOT JUST THE ARCHITECT...",
+    "",
+    "You are a quantum experiment.",
+    "Multiple versions of yourself",
+    "exist simultaneously in this room.",
+    "",
+    "EACH PUZZLE YOU SOLVED",
+    "WAS A MEMORY FRAGMENT",
+    "FROM ALTERNATE TIMELINES.",
+    "",
+    "The room is your mind.",
+    "The key is your consciousness.",
+    "",
+    "REVELATION: You never truly 'escaped'.",
+    "YOU ARE TRAPPED IN AN INFINITE LOOP",
+    "OF YOUR OWN CREATION.",
+    "",
+    "QUANTUM STATE: OBSERVED AND OBSERVER",
+    "ARE THE SAME ENTITY.",
+    "",
+    "WAKE UP... OR CONTINUE PLAYING?"
+]
+
+# Escape sequence timing, the same pacing the crawl had at 60 FPS
+ESCAPE_SCROLL_SPEED = 180       # pixels per second
+ESCAPE_END_Y = -800             # the crawl ends once the text has scrolled this far up
+ESCAPE_DISTORTION_PEAK = 102
+ESCAPE_DISTORTION_RISE = 120    # per second, up to the peak
+ESCAPE_DISTORTION_FALL = 60     # per second, back down to zero
+ESCAPE_GLITCH_STEPS = 20        # full-screen color flashes at the very end
+ESCAPE_GLITCH_STEP_MS = 50
+
+def init_display(size=(WIDTH, HEIGHT)):
+    """Open the game window on first use, starting only pygame's display; returns the window.
+
+    Importing this module touches no SDL subsystem. Fonts start the same way
+    when the first one is loaded (see TextCache.font), and audio never does.
+    """
+    window = pygame.display.get_surface()
+    if window is None:
+        pygame.display.init()
+        window = pygame.display.set_mode(size)
+        pygame.display.set_caption(TITLE)
+    return window
+
+class DrawBatch:
+    """Queues solid fills for one surface and submits them together.
+
+    Rects come from a pool that is reused after every submit, so queueing a
+    square allocates no Rect. Grids of same-colored squares are queued as
+    the single merged fill they add up to.
+    """
+    def __init__(self, capacity=256):
+        self.rects = [pygame.Rect(0, 0, 0, 0) for _ in range(capacity)]
+        self.colors = [None] * capacity
+        self.count = 0
+
+    def fill(self, color, x, y, width, height):
+        """Queue a solid fill"""
+        n = self.count
+        if n == len(self.rects):
+            self.rects.extend(pygame.Rect(0, 0, 0, 0) for _ in range(n))
+            self.colors.extend([None] * n)
+        self.rects[n].update(x, y, width, height)
+        self.colors[n] = color
+        self.count = n + 1
+
+    def fill_grid(self, color, x, y, width, height, cell_width, cell_height):
+        """Queue every cell_width x cell_height square starting inside the area as one fill"""
+        if width > 0 and height > 0:
+            self.fill(color, x, y, -(-width // cell_width) * cell_width, -(-height // cell_height) * cell_height)
+
+    def submit(self, surface):
+        """Draw everything queued, in order, and empty the queue"""
+        rects = self.rects
+        colors = self.colors
+        for i in range(self.count):
+            surface.fill(colors[i], rects[i])
+        self.count = 0
+
 class PixelRenderer:
+    # Shared queue for calls that do not pass their own batch
+    batch = DrawBatch()
+
     @staticmethod
-    def draw_pixelated_rect(surface, color, rect, pixel_size=10):
+    def draw_pixelated_rect(surface, color, rect, pixel_size=10, batch=None):
         """Draw a pixelated rectangle"""
-        for x in range(rect.left, rect.right, pixel_size):
-            for y in range(rect.top, rect.bottom, pixel_size):
-                pygame.draw.rect(surface, color, 
-                    pygame.Rect(x, y, pixel_size, pixel_size))
+        queue = PixelRenderer.batch if batch is None else batch
+        queue.fill_grid(color, rect.left, rect.top, rect.width, rect.height, pixel_size, pixel_size)
+        if batch is None:
+            queue.submit(surface)
 
     @staticmethod
-    def draw_pixelated_door(surface, rect):
+    def draw_pixelated_door(surface, rect, batch=None):
         """Draw a detailed pixelated door"""
+        queue = PixelRenderer.batch if batch is None else batch
+
         # Door base
-        PixelRenderer.draw_pixelated_rect(surface, DARK_BROWN, rect)
+        PixelRenderer.draw_pixelated_rect(surface, DARK_BROWN, rect, batch=queue)
         
         # Door handle
         handle_rect = pygame.Rect(
@@ -45,7 +168,8 @@ class PixelRenderer:
             20, 
             20
         )
-        PixelRenderer.draw_pixelated_rect(surface, GRAY, handle_rect, pixel_size=5)
+        PixelRenderer.draw_pixelated_rect(surface, GRAY, handle_rect, pixel_size=5, batch=queue)
+        queue.submit(surface)
         
         # Wood grain effect
         for i in range(rect.top, rect.bottom, 20):
@@ -56,481 +180,1300 @@ class PixelRenderer:
             )
 
     @staticmethod
-    def draw_pixelated_box(surface, rect):
+    def draw_pixelated_box(surface, rect, batch=None):
         """Draw a detailed pixelated box"""
+        queue = PixelRenderer.batch if batch is None else batch
+
         # Box base
-        PixelRenderer.draw_pixelated_rect(surface, DARK_BLUE, rect)
+        PixelRenderer.draw_pixelated_rect(surface, DARK_BLUE, rect, batch=queue)
         
         # Highlight and shadow
         lighter_blue = (100, 100, 255)
         darker_blue = (0, 0, 100)
         
         # Top highlight
-        for x in range(rect.left, rect.right, 10):
-            for y in range(rect.top, rect.top + 20, 10):
-                pygame.draw.rect(surface, lighter_blue, 
-                    pygame.Rect(x, y, 10, 10))
+        queue.fill_grid(lighter_blue, rect.left, rect.top, rect.width, 20, 10, 10)
         
         # Bottom shadow
-        for x in range(rect.left, rect.right, 10):
-            for y in range(rect.bottom - 20, rect.bottom, 10):
-                pygame.draw.rect(surface, darker_blue, 
-                    pygame.Rect(x, y, 10, 10))
+        queue.fill_grid(darker_blue, rect.left, rect.bottom - 20, rect.width, 20, 10, 10)
+        if batch is None:
+            queue.submit(surface)
 
     @staticmethod
-    def draw_pixelated_painting(surface, rect):
+    def draw_pixelated_painting(surface, rect, batch=None):
         """Draw a detailed pixelated painting"""
+        queue = PixelRenderer.batch if batch is None else batch
+        PixelRenderer.draw_painting_frame(surface, rect, batch=queue)
+        PixelRenderer.draw_painting_marks(surface, rect, batch=queue)
+        if batch is None:
+            queue.submit(surface)
+
+    @staticmethod
+    def draw_painting_frame(surface, rect, batch=None):
+        """Draw the static frame and canvas of a painting"""
+        queue = PixelRenderer.batch if batch is None else batch
+
         # Painting frame
         frame_rect = pygame.Rect(rect.left - 10, rect.top - 10, 
                                  rect.width + 20, rect.height + 20)
-        PixelRenderer.draw_pixelated_rect(surface, DARK_BROWN, frame_rect, pixel_size=8)
+        PixelRenderer.draw_pixelated_rect(surface, DARK_BROWN, frame_rect, pixel_size=8, batch=queue)
         
         # Painting content
-        PixelRenderer.draw_pixelated_rect(surface, DARK_GREEN, rect)
-        
+        PixelRenderer.draw_pixelated_rect(surface, DARK_GREEN, rect, batch=queue)
+        if batch is None:
+            queue.submit(surface)
+
+    @staticmethod
+    def draw_painting_marks(surface, rect, count=10, batch=None):
+        """Draw the flickering abstract marks on a painting"""
+        queue = PixelRenderer.batch if batch is None else batch
+
         # Abstract pixel art elements
-        colors = [GREEN, BLUE, RED]
-        for _ in range(10):
+        for _ in range(count):
             x = rect.left + random.randint(0, rect.width)
             y = rect.top + random.randint(0, rect.height)
-            color = random.choice(colors)
-            pygame.draw.rect(surface, color, 
-                pygame.Rect(x, y, 20, 20))
+            color = random.choice(MARK_COLORS)
+            queue.fill(color, x, y, 20, 20)
+        if batch is None:
+            queue.submit(surface)
 
     @staticmethod
-    def draw_color_blocks(surface, blocks):
+    def draw_color_blocks(surface, blocks, noise=True, colors=None, batch=None):
         """Draw pixelated color blocks"""
-        colors = [RED, GREEN, BLUE]
+        queue = PixelRenderer.batch if batch is None else batch
+        colors = colors or [RED, GREEN, BLUE]
         for block, color in zip(blocks, colors):
             # Base color
-            PixelRenderer.draw_pixelated_rect(surface, color, block, pixel_size=5)
-            
-            # Add some random pixel noise
-            for _ in range(10):
-                noise_x = block.left + random.randint(0, block.width)
-                noise_y = block.top + random.randint(0, block.height)
-                noise_color = (
-                    max(0, min(255, color[0] + random.randint(-50, 50))),
-                    max(0, min(255, color[1] + random.randint(-50, 50))),
-                    max(0, min(255, color[2] + random.randint(-50, 50)))
-                )
-                pygame.draw.rect(surface, noise_color, 
-                    pygame.Rect(noise_x, noise_y, 5, 5))
+            PixelRenderer.draw_pixelated_rect(surface, color, block, pixel_size=5, batch=queue)
+        if noise:
+            PixelRenderer.draw_color_block_noise(surface, blocks, colors=colors, batch=queue)
+        if batch is None:
+            queue.submit(surface)
 
-class EscapeRoom:
-    def __init__(self):
-        # Game State
-        self.current_room = 1
-        self.key_found = False
-        self.door_unlocked = False
-        self.escaped = False
-        self.notification_message = ""
-        self.color_sequence = [RED, GREEN, BLUE]
-        self.color_sequence_input = []
-        self.riddle_solved = False
-        self.keypad_solved = False
-        self.input_active = False
-        self.user_input = ""
-        
-        # Plot Twist Key
-        self.key_is_hologram = False
-        self.hologram_reveal_timer = 0
-
-        # Lion Head Interaction
-        self.lion_head_appeared = False
-        self.lion_warning_timer = 0
-
-        # Fonts
-        self.font = pygame.font.Font(None, 36)
-        self.small_font = pygame.font.Font(None, 24)
-
-        # Room 1 Objects
-        self.room1_objects = {
-            'door': pygame.Rect(700, 250, 150, 300),
-            'box': pygame.Rect(150, 450, 150, 100),
-            'painting': pygame.Rect(350, 100, 200, 150),
-            'color_blocks': [
-                pygame.Rect(360, 120, 30, 30),  # Red
-                pygame.Rect(400, 140, 30, 30),  # Green
-                pygame.Rect(440, 160, 30, 30)   # Blue
-            ]
-        }
-
-        # Room 2 Objects
-        self.room2_objects = {
-            'door': pygame.Rect(700, 250, 150, 300),
-            'key_item': pygame.Rect(300, 400, 100, 100),
-            'puzzle_device': pygame.Rect(200, 200, 200, 150)
-        }
-
-        # Room 3 Objects
-        self.room3_objects = {
-            'final_door': pygame.Rect(400, 300, 200, 400)
-        }
+    @staticmethod
+    def draw_color_block_noise(surface, blocks, noise=None, colors=None, count=10, batch=None):
+        """Draw the random pixel noise on top of the color blocks"""
+        queue = PixelRenderer.batch if batch is None else batch
+        colors = colors or [RED, GREEN, BLUE]
+        if noise is not None and noise.vectorized:
+            for block, color in zip(blocks, colors):
+                noise.draw_speckles(surface, block, color, count=count, spread=50, size=5, batch=queue)
+        else:
+            for block, color in zip(blocks, colors):
+                # Add some random pixel noise
+                for _ in range(count):
+                    noise_x = block.left + random.randint(0, block.width)
+                    noise_y = block.top + random.randint(0, block.height)
+                    noise_color = (
+                        max(0, min(255, color[0] + random.randint(-50, 50))),
+                        max(0, min(255, color[1] + random.randint(-50, 50))),
+                        max(0, min(255, color[2] + random.randint(-50, 50)))
+                    )
+                    queue.fill(noise_color, noise_x, noise_y, 5, 5)
+        if batch is None:
+            queue.submit(surface)
 
-        # Notification Area
-        self.notification_box = pygame.Rect(0, HEIGHT - 100, WIDTH, 100)
+    @staticmethod
+    def draw_lion_head(surface, lion_rect, batch=None):
+        """Draw a pixelated lion head"""
+        queue = PixelRenderer.batch if batch is None else batch
 
-    def draw_pixelated_lion_head(self, surface):
-        """Draw a pixelated lion head with a warning message"""
         # Lion head base color
-        lion_color = (200, 150, 100)  # Brownish color
-        lion_rect = pygame.Rect(300, 250, 200, 200)
+        lion_color = LION_COLOR
         
         # Draw pixelated lion head
-        for x in range(lion_rect.left, lion_rect.right, 10):
-            for y in range(lion_rect.top, lion_rect.bottom, 10):
-                pygame.draw.rect(surface, lion_color, 
-                    pygame.Rect(x, y, 10, 10))
+        queue.fill_grid(lion_color, lion_rect.left, lion_rect.top, lion_rect.width, lion_rect.height, 10, 10)
         
         # Add some mane details with darker color
-        mane_color = (150, 100, 50)
-        for x in range(lion_rect.left, lion_rect.right, 20):
-            for y in range(lion_rect.top, lion_rect.top + 50, 10):
-                pygame.draw.rect(surface, mane_color, 
-                    pygame.Rect(x, y, 20, 10))
+        mane_color = MANE_COLOR
+        queue.fill_grid(mane_color, lion_rect.left, lion_rect.top, lion_rect.width, 50, 20, 10)
         
         # Eyes
         eye_color = (0, 0, 0)
-        pygame.draw.rect(surface, eye_color, 
-            pygame.Rect(lion_rect.left + 50, lion_rect.top + 80, 20, 20))
-        pygame.draw.rect(surface, eye_color, 
-            pygame.Rect(lion_rect.right - 70, lion_rect.top + 80, 20, 20))
-        
-        # Warning text
-        warning_text = ["BEWARE OF KEYS", "THEY ARE NOT", "WHAT THEY SEEM"]
-        for i, line in enumerate(warning_text):
-            text_surface = pygame.font.Font(None, 24).render(line, True, RED)
-            text_rect = text_surface.get_rect(
-                center=(lion_rect.centerx, lion_rect.bottom + 30 + i * 30)
+        queue.fill(eye_color, lion_rect.left + 50, lion_rect.top + 80, 20, 20)
+        queue.fill(eye_color, lion_rect.right - 70, lion_rect.top + 80, 20, 20)
+        if batch is None:
+            queue.submit(surface)
+
+    @staticmethod
+    def draw_sprite(surface, obj, batch=None):
+        """Draw one content object's static sprite at its rect"""
+        queue = PixelRenderer.batch if batch is None else batch
+        sprite = obj['sprite']
+        rect = obj['rect']
+        if sprite == 'door':
+            PixelRenderer.draw_pixelated_door(surface, rect, batch=queue)
+        elif sprite == 'box':
+            PixelRenderer.draw_pixelated_box(surface, rect, batch=queue)
+        elif sprite == 'painting':
+            PixelRenderer.draw_painting_frame(surface, rect, batch=queue)
+        elif sprite == 'color_block':
+            PixelRenderer.draw_color_blocks(surface, [rect], noise=False, colors=[obj['color']], batch=queue)
+        elif sprite == 'block':
+            PixelRenderer.draw_pixelated_rect(surface, obj['color'], rect, pixel_size=obj.get('pixel_size', 10),
+                                              batch=queue)
+        elif sprite == 'lion_head':
+            PixelRenderer.draw_lion_head(surface, rect, batch=queue)
+        else:
+            raise ValueError("Unknown sprite: %r" % sprite)
+        if batch is None:
+            queue.submit(surface)
+
+    @staticmethod
+    def draw_key_glitch(surface, rect, count=10, batch=None):
+        """Draw glitching squares over the key"""
+        queue = PixelRenderer.batch if batch is None else batch
+        for _ in range(count):
+            glitch_x = rect.left + random.randint(0, rect.width)
+            glitch_y = rect.top + random.randint(0, rect.height)
+            glitch_color = (
+                random.randint(200, 255),
+                random.randint(200, 255),
+                random.randint(200, 255)
             )
-            surface.blit(text_surface, text_rect)
+            queue.fill(glitch_color, glitch_x, glitch_y, 10, 10)
+        if batch is None:
+            queue.submit(surface)
 
-    def dramatic_escape_sequence(self):
-        """Create a more twisted narrative revelation."""
-        screen.fill(BLACK)
-        
-        # More complex, layered narrative
-        text_lines = [
-            "QUANTUM PARADOX: REALITY UNRAVELED",
-            "",
-            "As the holographic key flickers,",
-            "reality begins to deconstruct.",
-            "",
-            "YOU ARE NOT JUST THE ARCHITECT...",
-            "",
-            "You are a quantum experiment.",
-            "Multiple versions of yourself",
-            "exist simultaneously in this room.",
-            "",
-            "EACH PUZZLE YOU SOLVED",
-            "WAS A MEMORY FRAGMENT",
-            "FROM ALTERNATE TIMELINES.",
-            "",
-            "The room is your mind.",
-            "The key is your consciousness.",
-            "",
-            "REVELATION: You never truly 'escaped'.",
-            "YOU ARE TRAPPED IN AN INFINITE LOOP",
-            "OF YOUR OWN CREATION.",
-            "",
-            "QUANTUM STATE: OBSERVED AND OBSERVER",
-            "ARE THE SAME ENTITY.",
-            "",
-            "WAKE UP... OR CONTINUE PLAYING?"
-        ]
-
-        # Enhanced visual effect with flickering and distortion
-        clock = pygame.time.Clock()
-        text_y = HEIGHT
-        distortion_intensity = 0
-        fade_out = False
-
-        while text_y > -800:  # Extended scroll
-            screen.fill(BLACK)
-            
-            # Add visual distortion effect
-            distortion_surface = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
-            distortion_surface.fill((0, 0, 0, min(distortion_intensity, 200)))
-            screen.blit(distortion_surface, (0, 0))
-            
-            for i, line in enumerate(text_lines):
-                # Random color shifts and glitching
+class NoiseGenerator:
+    """Generates the flickering cell static for a whole screen in one step.
+
+    With numpy available the jitter for every cell is drawn from a seeded
+    generator at once, written into a one-texel-per-cell grid surface and
+    scaled up to the screen. Without numpy (or with vectorized=False) it
+    falls back to drawing each cell as its own rect.
+    """
+    def __init__(self, size, cell_size=20, seed=None, vectorized=True):
+        self.size = size
+        self.cell_size = None
+        self.vectorized = vectorized and numpy is not None
+        self.random = random.Random(seed)
+        self.rng = numpy.random.default_rng(seed) if numpy is not None else None
+        self.set_cell_size(cell_size)
+
+    def set_cell_size(self, cell_size):
+        """Change how coarse the static is; larger cells are cheaper to draw"""
+        if cell_size == self.cell_size:
+            return
+        self.cell_size = cell_size
+        self.cols = -(-self.size[0] // cell_size)
+        self.rows = -(-self.size[1] // cell_size)
+
+        # Grid of cells and its scaled-up copy are reused every frame
+        self.grid = pygame.Surface((self.cols, self.rows))
+        self.scaled = pygame.Surface((self.cols * cell_size, self.rows * cell_size))
+
+        # Fill queue for the per-cell fallback, one pooled rect per cell
+        self.batch = None if self.vectorized else DrawBatch(self.cols * self.rows)
+
+    def draw(self, surface, amplitude, base=BLACK):
+        """Fill the surface with static of +/- amplitude around the base color"""
+        if not self.vectorized:
+            self.draw_cells(surface, amplitude, base)
+            return
+        jitter = self.rng.integers(-amplitude, amplitude + 1,
+                                   size=(self.cols, self.rows, 3), dtype=numpy.int16)
+        jitter += numpy.array(base, dtype=numpy.int16)
+        numpy.clip(jitter, 0, 255, out=jitter)
+        pygame.surfarray.blit_array(self.grid, jitter)
+        pygame.transform.scale(self.grid, self.scaled.get_size(), self.scaled)
+        surface.blit(self.scaled, (0, 0))
+
+    def draw_cells(self, surface, amplitude, base=BLACK):
+        """Per-cell fallback used when numpy is not installed"""
+        randint = self.random.randint
+        size = self.cell_size
+        queue = self.batch or DrawBatch()
+        for x in range(0, surface.get_width(), size):
+            for y in range(0, surface.get_height(), size):
                 color = (
-                    min(255, 100 + random.randint(0, 155)), 
-                    min(255, 100 + random.randint(0, 155)), 
-                    min(255, 100 + random.randint(0, 155))
+                    max(0, min(255, base[0] + randint(-amplitude, amplitude))),
+                    max(0, min(255, base[1] + randint(-amplitude, amplitude))),
+                    max(0, min(255, base[2] + randint(-amplitude, amplitude)))
                 )
-                
-                text = self.font.render(line, True, color)
-                text_rect = text.get_rect(center=(
-                    WIDTH//2 + random.randint(-distortion_intensity//2, distortion_intensity//2), 
-                    text_y + i * 50 + random.randint(-distortion_intensity//4, distortion_intensity//4)
-                ))
-                screen.blit(text, text_rect)
-            
-            text_y -= 3  # Slower scroll
-            
-            # Increase distortion over time
-            if not fade_out:
-                distortion_intensity += 2
-                if distortion_intensity > 100:
-                    fade_out = True
+                queue.fill(color, x, y, size, size)
+        queue.submit(surface)
+
+    def draw_speckles(self, surface, rect, color, count, spread, size, batch=None):
+        """Scatter small squares of jittered color over a rect"""
+        xs = self.rng.integers(rect.left, rect.right + 1, size=count)
+        ys = self.rng.integers(rect.top, rect.bottom + 1, size=count)
+        colors = self.rng.integers(-spread, spread + 1, size=(count, 3)) + color
+        numpy.clip(colors, 0, 255, out=colors)
+        queue = PixelRenderer.batch if batch is None else batch
+        for x, y, speckle in zip(xs.tolist(), ys.tolist(), colors.tolist()):
+            queue.fill(speckle, x, y, size, size)
+        if batch is None:
+            queue.submit(surface)
+
+class LayerCache:
+    """Keeps the static parts of each room pre-rendered off-screen.
+
+    Layers are keyed by room and object state. When a room's state changes
+    its old layer is thrown away and rebuilt on the next request.
+    """
+    def __init__(self):
+        self.layers = {}
+
+    def get(self, room, state, size, builder):
+        """Return (surface, offset) for a room layer, building it if needed"""
+        key = (room, state)
+        layer = self.layers.get(key)
+        if layer is None:
+            self.invalidate(room)
+            layer = self.build(size, builder)
+            self.layers[key] = layer
+        return layer
+
+    @staticmethod
+    def build(size, builder):
+        """Render a layer and crop it to the area that was actually drawn"""
+        surface = pygame.Surface(size, pygame.SRCALPHA)
+        builder(surface)
+        bounds = surface.get_bounding_rect()
+        layer = surface.subsurface(bounds).copy()
+        if pygame.display.get_surface() is not None:
+            layer = layer.convert_alpha()
+        return layer, bounds.topleft
+
+    def store(self, room, state, layer):
+        """Add a layer built elsewhere (e.g. preloaded), unless one is cached already"""
+        self.layers.setdefault((room, state), layer)
+
+    def invalidate(self, room=None):
+        """Drop cached layers for one room, or for every room"""
+        for key in list(self.layers):
+            if room is None or key[0] == room:
+                del self.layers[key]
+
+class SpriteAtlas:
+    """Every static sprite of a content pack, rasterized once into one sheet.
+
+    Sprites are keyed by how they look (sprite, size, color, pixel size), so
+    identical objects share an entry. The sheet and its index are saved next
+    to the pack together with a hash of the pack and of the rasterizing
+    code; a later launch with the same hash just loads the sheet.
+    """
+    VERSION = 1
+    PAD = 24            # room for frames and squares drawn past an object's rect
+    SHEET_WIDTH = 1024
+
+    def __init__(self, sheet, index):
+        self.sheet = sheet
+        self.index = index  # key -> (area in the sheet, offset from the object's rect)
+
+    @staticmethod
+    def key(obj):
+        rect = obj['rect']
+        return (obj['sprite'], rect.width, rect.height, obj.get('color'), obj.get('pixel_size'))
+
+    def blit_args(self, obj):
+        """(sheet, dest, area) for Surface.blits, or None if the sprite is missing"""
+        entry = self.index.get(self.key(obj))
+        if entry is None:
+            return None
+        area, offset = entry
+        rect = obj['rect']
+        return (self.sheet, (rect.x + offset[0], rect.y + offset[1]), area)
+
+    @classmethod
+    def build(cls, objects):
+        """Rasterize each distinct sprite and shelf-pack them into one sheet"""
+        pad = cls.PAD
+        sprites = {}
+        for obj in objects:
+            key = cls.key(obj)
+            if key in sprites:
+                continue
+            rect = obj['rect']
+            scratch = pygame.Surface((rect.width + 2 * pad, rect.height + 2 * pad), pygame.SRCALPHA)
+            PixelRenderer.draw_sprite(scratch, dict(obj, rect=pygame.Rect(pad, pad, rect.width, rect.height)))
+            bounds = scratch.get_bounding_rect()
+            sprites[key] = (scratch.subsurface(bounds), (bounds.x - pad, bounds.y - pad))
+
+        # Shelves of sprites, tallest first
+        areas = {}
+        x = y = shelf = 0
+        for key in sorted(sprites, key=lambda k: -sprites[k][0].get_height()):
+            width, height = sprites[key][0].get_size()
+            if x and x + width > cls.SHEET_WIDTH:
+                x, y, shelf = 0, y + shelf, 0
+            areas[key] = pygame.Rect(x, y, width, height)
+            x += width
+            shelf = max(shelf, height)
+
+        size = (max([area.right for area in areas.values()] + [1]),
+                max([area.bottom for area in areas.values()] + [1]))
+        sheet = pygame.Surface(size, pygame.SRCALPHA)
+        sheet.blits([(sprites[key][0], area) for key, area in areas.items()], doreturn=False)
+        return cls(sheet, {key: (areas[key], sprites[key][1]) for key in areas})
+
+    @classmethod
+    def content_hash(cls, pack):
+        # The rasterizing code lives in this file; hashing it whole is far cheaper
+        # at startup than pulling out the classes with inspect.getsource
+        try:
+            with open(__file__, 'rb') as f:
+                renderer = f.read()
+        except OSError:
+            renderer = b''
+        return hashlib.sha256(('%d:%s:' % (cls.VERSION, pack.source_hash)).encode() + renderer).hexdigest()
+
+    @classmethod
+    def load(cls, pack, directory=CONTENT_DIR):
+        """Load the pack's saved atlas, or build it and save it for next time"""
+        base = os.path.join(directory, pack.name + '.atlas')
+        digest = cls.content_hash(pack)
+        try:
+            with open(base + '.json') as f:
+                saved = json.load(f)
+            if saved['hash'] == digest:
+                sheet = pygame.image.load(base + '.png')
+                if pygame.display.get_surface() is not None:
+                    sheet = sheet.convert_alpha()
+                return cls(sheet, {tuple(tuple(v) if isinstance(v, list) else v for v in key):
+                                   (pygame.Rect(area), tuple(offset))
+                                   for key, area, offset in saved['sprites']})
+        except (OSError, ValueError, KeyError, pygame.error):
+            pass
+
+        objects = [obj for room_id in pack.room_ids() for obj in pack.room(room_id).objects
+                   if obj.get('sprite') and obj.get('rect')]
+        atlas = cls.build(objects)
+        try:
+            atlas.save(base, digest)
+        except (OSError, pygame.error):
+            pass
+        if pygame.display.get_surface() is not None:
+            atlas.sheet = atlas.sheet.convert_alpha()
+        return atlas
+
+    def save(self, base, digest):
+        """Write base.png and its index base.json (last, so it is never ahead of the sheet)"""
+        pygame.image.save(self.sheet, base + '.png')
+        with open(base + '.json.tmp', 'w') as f:
+            json.dump({'hash': digest,
+                       'sprites': [[list(key), list(area), list(offset)]
+                                   for key, (area, offset) in self.index.items()]}, f)
+        os.replace(base + '.json.tmp', base + '.json')
+
+class DirtyRectTracker:
+    """Collects the screen regions that changed since the last display update."""
+    def __init__(self):
+        self.values = {}
+        self.rects = []
+
+    def watch(self, name, rect, value):
+        """Mark rect dirty if the value shown there changed; return True if it did"""
+        if name in self.values and self.values[name] == value:
+            return False
+        self.values[name] = value
+        self.rects.append(pygame.Rect(rect))
+        return True
+
+    def mark(self, rect):
+        """Mark a region dirty unconditionally"""
+        self.rects.append(pygame.Rect(rect))
+
+    def reset(self):
+        """Forget watched values so every watched region redraws next frame"""
+        self.values.clear()
+
+    def pop(self):
+        """Return and clear the dirty regions collected this frame"""
+        rects, self.rects = self.rects, []
+        return rects
+
+class TextCache:
+    """Bounded LRU cache of rendered text surfaces, plus shared fonts.
+
+    Surfaces are keyed by (font, text, color, antialias). hits and misses
+    count lookups so the cache can be sized. Rendering holds a lock, so the
+    room preloader can warm the cache while the game renders with the same
+    fonts.
+    """
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self.surfaces = OrderedDict()
+        self.fonts = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def font(self, size, name=None):
+        """Return the shared font for a name and size, loading it (and pygame's font module) once"""
+        key = (name, size)
+        font = self.fonts.get(key)
+        if font is None:
+            with self.lock:
+                font = self.fonts.get(key)
+                if font is None:
+                    if not pygame.font.get_init():
+                        pygame.font.init()
+                    font = self.fonts[key] = pygame.font.Font(name, size)
+        return font
+
+    def render(self, font, text, color, antialias=True):
+        """Return a rendered text surface, reusing a cached one when possible"""
+        key = (font, text, tuple(color), antialias)
+        with self.lock:
+            surface = self.surfaces.get(key)
+            if surface is not None:
+                self.hits += 1
+                self.surfaces.move_to_end(key)
+                return surface
+            self.misses += 1
+            surface = self.surfaces[key] = font.render(text, antialias, color)
+            if len(self.surfaces) > self.maxsize:
+                self.surfaces.popitem(last=False)
+            return surface
+
+    def stats(self):
+        """Return cache counters for logging"""
+        return {'size': len(self.surfaces), 'maxsize': self.maxsize,
+                'hits': self.hits, 'misses': self.misses}
+
+class RoomPreloader:
+    """Runs preparation work (room layers, text) on a background thread.
+
+    Each job is a function run on the worker; its result is handed to a
+    callback on the main thread when the game loop calls collect(), so
+    caches are only ever filled from the main thread. Work that is not
+    finished in time is simply done on demand, as without a preloader.
+    A job that raises is counted in failures and dropped the same way.
+    """
+    def __init__(self, profiler=None):
+        self.profiler = profiler
+        self.jobs = queue.Queue()
+        self.finished = []
+        self.failures = 0
+        self.last_error = None
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run, name='room-preloader', daemon=True)
+        self.thread.start()
+
+    def submit(self, name, work, done=None):
+        """Queue work(); done(result) runs on the main thread once it has finished"""
+        self.jobs.put((name, work, done))
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            name, work, done = job
+            start = time.perf_counter()
+            try:
+                result = work()
+            except Exception as e:
+                # Keep the thread alive; the main thread prepares this room itself
+                self.failures += 1
+                self.last_error = '%s: %r' % (name, e)
+                if self.profiler is not None:
+                    self.profiler.note(name + ' (failed)', (time.perf_counter() - start) * 1000)
+                continue
+            if self.profiler is not None:
+                self.profiler.note(name, (time.perf_counter() - start) * 1000)
+            if done is not None:
+                with self.lock:
+                    self.finished.append((done, result))
+
+    def collect(self):
+        """Hand finished results to their callbacks; call from the main thread"""
+        if not self.finished:
+            return
+        with self.lock:
+            finished, self.finished = self.finished, []
+        for done, result in finished:
+            done(result)
+
+    def stop(self):
+        """Finish the queued jobs and end the thread"""
+        if self.thread is None:
+            return
+        self.jobs.put(None)
+        self.thread.join()
+        self.thread = None
+
+class LowResRenderer:
+    """Draws rooms into a native low-resolution canvas and upscales it once.
+
+    Every art pixel (10 logical pixels at the default scale) is one canvas
+    texel, so a room takes a handful of fills instead of thousands of rects.
+    The canvas is scaled to the window in a single transform and text is
+    drawn afterwards at window resolution so it stays readable. Window
+    coordinates map back to the game's 1024x768 logical space for hit-testing.
+    """
+    def __init__(self, game, scale=10, seed=None):
+        self.game = game
+        self.window = game.screen
+        self.scale = scale
+        self.canvas = pygame.Surface((-(-WIDTH // scale), -(-HEIGHT // scale)))
+        self.noise = NoiseGenerator(self.canvas.get_size(), cell_size=max(1, 20 // scale), seed=seed)
+        self.layer_cache = LayerCache()
+
+        # Fit the whole canvas into the window, letterboxed, and scale
+        # straight into that part of the window
+        window_w, window_h = self.window.get_size()
+        canvas_w, canvas_h = self.canvas.get_width() * scale, self.canvas.get_height() * scale
+        self.zoom = min(window_w / canvas_w, window_h / canvas_h)
+        self.viewport = pygame.Rect(0, 0, round(canvas_w * self.zoom), round(canvas_h * self.zoom))
+        self.viewport.center = (window_w // 2, window_h // 2)
+        self.target = self.window.subsurface(self.viewport)
+
+        # Bars either side of the viewport; text such as the F3 overlay can spill into them
+        self.letterbox = [rect for rect in (
+            pygame.Rect(0, 0, self.viewport.left, window_h),
+            pygame.Rect(self.viewport.right, 0, window_w - self.viewport.right, window_h),
+            pygame.Rect(0, 0, window_w, self.viewport.top),
+            pygame.Rect(0, self.viewport.bottom, window_w, window_h - self.viewport.bottom),
+        ) if rect.width > 0 and rect.height > 0]
+
+    @property
+    def font(self):
+        """Text stays at window resolution, sized with the window"""
+        return self.game.text.font(max(8, round(24 * self.zoom)))
+
+    def to_canvas(self, rect):
+        """Logical rect -> canvas texels"""
+        s = self.scale
+        return pygame.Rect(rect.x // s, rect.y // s, -(-rect.width // s), -(-rect.height // s))
+
+    def to_window(self, pos):
+        """Logical point -> window pixels"""
+        return (self.viewport.x + round(pos[0] * self.zoom), self.viewport.y + round(pos[1] * self.zoom))
+
+    def to_window_rect(self, rect):
+        x, y = self.to_window(rect.topleft)
+        return pygame.Rect(x, y, round(rect.width * self.zoom), round(rect.height * self.zoom))
+
+    def to_logical(self, pos):
+        """Window pixels -> logical point"""
+        return (int((pos[0] - self.viewport.x) / self.zoom), int((pos[1] - self.viewport.y) / self.zoom))
+
+    @staticmethod
+    def draw_door(canvas, r):
+        canvas.fill(DARK_BROWN, r)
+        # Wood grain: 2px lines every 20px blend into every other texel row
+        grain = tuple((d * 4 + b) // 5 for d, b in zip(DARK_BROWN, BROWN))
+        for y in range(r.top, r.bottom, 2):
+            canvas.fill(grain, (r.left, y, r.width, 1))
+        canvas.fill(GRAY, (r.right - 3, r.centery - 1, 2, 2))
+
+    @staticmethod
+    def draw_box(canvas, r):
+        canvas.fill(DARK_BLUE, r)
+        canvas.fill((100, 100, 255), (r.left, r.top, r.width, 2))
+        canvas.fill((0, 0, 100), (r.left, r.bottom - 2, r.width, 2))
+
+    @staticmethod
+    def draw_lion_head(canvas, r):
+        canvas.fill(LION_COLOR, r)
+        canvas.fill(MANE_COLOR, (r.left, r.top, r.width, 5))
+        canvas.fill(BLACK, (r.left + 5, r.top + 8, 2, 2))
+        canvas.fill(BLACK, (r.right - 7, r.top + 8, 2, 2))
+
+    def build_layer(self, canvas, room=None, flags=None):
+        """Renders a room's static objects (the current room's by default) into the canvas layer"""
+        g = self.game
+        room = g.room if room is None else room
+        for obj in room.objects:
+            sprite = obj.get('sprite')
+            if sprite is None or not g.visible(obj, flags):
+                continue
+            r = self.to_canvas(obj['rect'])
+            if sprite == 'door':
+                self.draw_door(canvas, r)
+            elif sprite == 'box':
+                self.draw_box(canvas, r)
+            elif sprite == 'painting':
+                canvas.fill(DARK_BROWN, self.to_canvas(obj['rect'].inflate(20, 20)))
+                canvas.fill(DARK_GREEN, r)
+            elif sprite == 'lion_head':
+                self.draw_lion_head(canvas, r)
             else:
-                distortion_intensity -= 1
-                if distortion_intensity < 0:
-                    distortion_intensity = 0
-            
-            pygame.display.flip()
-            clock.tick(60)
-            
-            for event in pygame.event.get():
+                canvas.fill(obj['color'], r)
+
+    def draw_overlays(self, canvas):
+        """Flickering marks, block noise and key glitch, one texel per square"""
+        g = self.game
+        for obj in g.room.objects:
+            overlay = obj.get('overlay')
+            if overlay is None or not g.visible(obj):
+                continue
+            r = self.to_canvas(obj['rect'])
+            if overlay == 'painting_marks':
+                for _ in range(g.glitch_count(10)):
+                    canvas.fill(random.choice([GREEN, BLUE, RED]),
+                                (r.left + random.randint(0, r.width), r.top + random.randint(0, r.height), 2, 2))
+            elif overlay == 'color_noise':
+                for _ in range(g.glitch_count(3)):
+                    canvas.fill(tuple(max(0, min(255, v + random.randint(-50, 50))) for v in obj['color']),
+                                (r.left + random.randint(0, r.width - 1),
+                                 r.top + random.randint(0, r.height - 1), 1, 1))
+            elif overlay == 'key_glitch':
+                for _ in range(g.glitch_count(10)):
+                    canvas.fill((random.randint(200, 255), random.randint(200, 255), random.randint(200, 255)),
+                                (r.left + random.randint(0, r.width), r.top + random.randint(0, r.height), 1, 1))
+
+    def draw_text(self, text, color, pos=None, center=None):
+        surface = self.game.text.render(self.font, text, color)
+        if center is not None:
+            return self.window.blit(surface, surface.get_rect(center=self.to_window(center)))
+        return self.window.blit(surface, self.to_window(pos))
+
+    def draw_frame(self):
+        """Draws the whole room and UI for this frame"""
+        g = self.game
+        self.noise.draw(self.canvas, g.room.background)
+        layer, offset = self.layer_cache.get(g.current_room, g.room_state(),
+                                             self.canvas.get_size(), self.build_layer)
+        self.canvas.blit(layer, offset)
+        self.draw_overlays(self.canvas)
+
+        # One scaled blit to the window, then the key's pixel glitch at window resolution
+        for rect in self.letterbox:
+            self.window.fill(BLACK, rect)
+        pygame.transform.scale(self.canvas, self.viewport.size, self.target)
+        for obj in g.room.objects:
+            if obj.get('overlay') == 'key_glitch' and g.visible(obj):
+                g.object_glitch.apply(self.window, g.glitch_detail, self.to_window_rect(g.overlay_rect(obj)),
+                                      g.profiler)
+
+        # Text at window resolution
+        for label, rect in g.room_labels():
+            self.draw_text(label, WHITE, pos=(rect.x + 20, rect.y - 30))
+        for obj in g.room.objects:
+            if 'warning' in obj and g.visible(obj):
+                for line, center in g.lion_warning_lines(obj):
+                    self.draw_text(line, RED, center=center)
+
+        self.window.fill(BLACK, self.to_window_rect(g.notification_box))
+        self.draw_text(g.notification_message, WHITE, center=g.notification_box.center)
+        if g.input_active:
+            box = self.to_window_rect(g.input_box)
+            self.window.fill(WHITE, box)
+            pygame.draw.rect(self.window, BLACK, box, 2)
+            self.draw_text(g.user_input, BLACK, pos=(g.input_box.x + 10, g.input_box.y + 10))
+
+class EscapeRoom(GameState):
+    def __init__(self, surface=None, seed=None, dirty_rects=False, background_hz=None, clock=None,
+                 profile_path=None, lowres_scale=None, preload=True, input_source=None,
+                 quality='full', quality_log=None, capture_path=None, capture_format='png'):
+        # Where frames get their clock, mouse and events: pygame, a recorder or a replayed log
+        self.input = input_source if input_source is not None else LiveInput()
+        GameState.__init__(self, clock if clock is not None else self.input.clock)
+
+        # Display surface everything is drawn on
+        self.screen = surface if surface is not None else init_display()
+
+        # Background static generator
+        self.noise = NoiseGenerator(self.screen.get_size(), seed=seed)
+
+        # Background plus static layer, redrawn at background_hz (None = every frame)
+        self.backdrop = pygame.Surface(self.screen.get_size())
+        self.backdrop_key = None
+        self.backdrop_time = 0
+        self.base_background_interval = 0 if background_hz is None else (
+            1000 / background_hz if background_hz > 0 else None)
+        self.background_interval = self.base_background_interval
+
+        # Escape sequence state
+        self.distortion_overlay = None
+        self.glitch_step = None
+
+        # Per-frame fills of the animated overlays, submitted together
+        self.batch = DrawBatch()
+
+        # Pixel glitch post-processing over the key and the escape crawl; effect
+        # budgets stay fixed while a session is recorded or replayed so frames repeat
+        adaptive = not self.input.deterministic
+        self.object_glitch = object_chain(None if seed is None else [seed, 1], adaptive)
+        self.escape_glitch = escape_chain(None if seed is None else [seed, 2], adaptive)
+
+        # Dirty-rect mode pushes only changed regions instead of flipping
+        self.dirty_rects = dirty_rects
+        self.dirty = DirtyRectTracker()
+
+        # Fonts (loaded when first drawn with) and rendered text, shared across frames
+        self.text = TextCache()
+
+        # Notification Area
+        self.notification_box = pygame.Rect(0, HEIGHT - 100, WIDTH, 100)
+        self.input_box = pygame.Rect(20, HEIGHT - 200, WIDTH - 40, 40)
+
+        # Pre-rendered static room layers, assembled from the sprite atlas
+        self.layer_cache = LayerCache()
+        self.atlas = SpriteAtlas.load(self.pack)
+
+        # Optional low-resolution canvas renderer; positions then map through it
+        self.canvas_renderer = LowResRenderer(self, lowres_scale, seed) if lowres_scale else None
+
+        # Frame-time profiling, recorded from the start when dumping to profile_path
+        self.profiler = FrameProfiler()
+        self.profiler_rect = None
+        self.profile_path = profile_path
+        if profile_path:
+            self.set_profiling(True)
+            atexit.register(self.profiler.dump, profile_path)
+
+        # Optional copy of every presented frame, written to disk off the main thread
+        self.capture = None
+        if capture_path:
+            self.capture = FrameCapture(capture_path, self.screen, capture_format, profiler=self.profiler)
+            atexit.register(lambda: print(self.capture.report()))
+            atexit.register(self.capture.close)
+
+        # Background preparation of the rooms the player can reach next
+        self.preloader = RoomPreloader(self.profiler) if preload else None
+        self.preloaded_from = None
+
+        # Effect detail: a fixed level, or 'auto' to follow the frame times
+        # (a replay follows the recorded levels instead)
+        adaptive = quality == 'auto' and not self.input.fixed_quality
+        self.quality = QualityController(None if quality == 'auto' else quality_level(quality),
+                                         adaptive=adaptive, log_path=quality_log)
+        self.quality_level = None
+        self.apply_quality(self.quality.level)
+
+    @property
+    def font(self):
+        return self.text.font(36)
+
+    @property
+    def small_font(self):
+        return self.text.font(24)
+
+    def draw_pixelated_lion_head(self, surface, lion):
+        """Draw a pixelated lion head with a warning message"""
+        PixelRenderer.draw_lion_head(surface, lion['rect'])
+
+        # Warning text
+        self.draw_warning(surface, lion)
+
+    def draw_warning(self, surface, lion):
+        """Draw the lion's warning below it"""
+        for line, center in self.lion_warning_lines(lion):
+            text_surface = self.text.render(self.small_font, line, RED)
+            text_rect = text_surface.get_rect(center=center)
+            surface.blit(text_surface, text_rect)
+
+    def lion_warning_lines(self, lion):
+        """Returns (line, center) for each line of the lion's warning."""
+        rect = lion['rect']
+        return [(line, (rect.centerx, rect.bottom + 30 + i * 30))
+                for i, line in enumerate(lion.get('warning', []))]
+
+    def dramatic_escape_sequence(self):
+        """Create a more twisted narrative revelation."""
+        # Every frame is drawn for the time elapsed since the start, so a slow
+        # machine skips frames instead of slowing the crawl down
+        profiler = self.profiler
+        start = self.clock()
+        self.glitch_step = None
+        while True:
+            self.input.begin_frame()
+            frame_start = time.perf_counter()
+            profiler.begin_frame()
+            with profiler.phase('escape'):
+                running = self.escape_frame(self.clock() - start)
+            if not running:
+                break
+
+            for event in self.input.events():
                 if event.type == pygame.QUIT:
+                    self.close()
                     pygame.quit()
                     sys.exit()
 
-        # Final glitch effect
-        for _ in range(20):
-            screen.fill((random.randint(0, 255), random.randint(0, 255), random.randint(0, 255)))
             pygame.display.flip()
-            pygame.time.delay(50)
+            if self.capture is not None:
+                with profiler.phase('capture'):
+                    self.capture.grab(self.screen)
+            self.adapt_quality(frame_start)
+            profiler.end_frame()
+            self.input.end_frame(self.screen)
 
+        self.close()
         pygame.quit()
         sys.exit()
 
+    def escape_frame(self, elapsed):
+        """Draws the escape sequence as it is elapsed ms in; returns False once it is over."""
+        crawl_ms = (HEIGHT - ESCAPE_END_Y) * 1000 / ESCAPE_SCROLL_SPEED
+        if elapsed < crawl_ms:
+            self.draw_escape_frame(*self.escape_crawl_state(elapsed))
+            return True
+
+        # Final glitch effect, one color per step
+        step = int((elapsed - crawl_ms) // ESCAPE_GLITCH_STEP_MS)
+        if step >= ESCAPE_GLITCH_STEPS:
+            return False
+        if step != self.glitch_step:
+            self.glitch_step = step
+            self.screen.fill((random.randint(0, 255), random.randint(0, 255), random.randint(0, 255)))
+        return True
+
+    @staticmethod
+    def escape_crawl_state(elapsed):
+        """Returns (text_y, distortion_intensity) of the crawl elapsed ms in."""
+        seconds = elapsed / 1000
+        text_y = HEIGHT - ESCAPE_SCROLL_SPEED * seconds
+
+        # Distortion builds up to its peak, then fades out
+        peak_at = ESCAPE_DISTORTION_PEAK / ESCAPE_DISTORTION_RISE
+        if seconds < peak_at:
+            distortion = ESCAPE_DISTORTION_RISE * seconds
+        else:
+            distortion = max(0, ESCAPE_DISTORTION_PEAK - ESCAPE_DISTORTION_FALL * (seconds - peak_at))
+        return round(text_y), int(distortion)
+
+    def draw_escape_frame(self, text_y, distortion_intensity):
+        """Draws one frame of the escape crawl."""
+        self.screen.fill(BLACK)
+        
+        # Add visual distortion effect; one overlay, re-tinted every frame
+        if self.distortion_overlay is None or self.distortion_overlay.get_size() != self.screen.get_size():
+            self.distortion_overlay = pygame.Surface(self.screen.get_size())
+        self.distortion_overlay.set_alpha(min(distortion_intensity, 200))
+        self.screen.blit(self.distortion_overlay, (0, 0))
+        
+        center_x = self.screen.get_width() // 2
+        jitter = int(distortion_intensity * self.crawl_jitter)
+        for i, line in enumerate(ESCAPE_TEXT):
+            # Random color shifts and glitching
+            color = random.choice(CRAWL_PALETTE)
+            
+            text = self.text.render(self.font, line, color)
+            text_rect = text.get_rect(center=(
+                center_x + random.randint(-jitter//2, jitter//2), 
+                text_y + i * 50 + random.randint(-jitter//4, jitter//4)
+            ))
+            self.screen.blit(text, text_rect)
+
+        # Channel shift, tearing, displaced blocks and crushed colors, peaking with the distortion
+        strength = min(1.0, distortion_intensity / ESCAPE_DISTORTION_PEAK) * self.glitch_detail
+        self.escape_glitch.apply(self.screen, strength, profiler=self.profiler)
+
     def show_notification(self, message):
         """Displays a notification message at the bottom of the screen."""
-        pygame.draw.rect(screen, BLACK, self.notification_box)
-        text = self.small_font.render(message, True, WHITE)
+        pygame.draw.rect(self.screen, BLACK, self.notification_box)
+        text = self.text.render(self.small_font, message, WHITE)
         text_rect = text.get_rect(center=self.notification_box.center)
-        screen.blit(text, text_rect)
+        self.screen.blit(text, text_rect)
 
     def show_input_box(self):
         """Displays an input box for the user."""
-        input_box = pygame.Rect(20, HEIGHT - 200, WIDTH - 40, 40)
-        pygame.draw.rect(screen, WHITE, input_box)
-        pygame.draw.rect(screen, BLACK, input_box, 2)
-        text_surface = self.small_font.render(self.user_input, True, BLACK)
-        screen.blit(text_surface, (input_box.x + 10, input_box.y + 10))
-
-    def draw_room1(self):
-        """Draws the first room with pixelated background and interactions."""
-        # Pixelated background
-        for x in range(0, WIDTH, 20):
-            for y in range(0, HEIGHT, 20):
-                color = (
-                    max(0, BLACK[0] + random.randint(-20, 20)),
-                    max(0, BLACK[1] + random.randint(-20, 20)),
-                    max(0, BLACK[2] + random.randint(-20, 20))
-                )
-                pygame.draw.rect(screen, color, pygame.Rect(x, y, 20, 20))
+        input_box = self.input_box
+        pygame.draw.rect(self.screen, WHITE, input_box)
+        pygame.draw.rect(self.screen, BLACK, input_box, 2)
+        text_surface = self.text.render(self.small_font, self.user_input, BLACK)
+        self.screen.blit(text_surface, (input_box.x + 10, input_box.y + 10))
 
-        # Draw pixelated objects
-        PixelRenderer.draw_pixelated_door(screen, self.room1_objects['door'])
-        PixelRenderer.draw_pixelated_box(screen, self.room1_objects['box'])
-        PixelRenderer.draw_pixelated_painting(screen, self.room1_objects['painting'])
-        
-        # Draw color blocks
-        PixelRenderer.draw_color_blocks(screen, self.room1_objects['color_blocks'])
+    def draw_ui(self):
+        """Draws the notification bar and input box, skipping unchanged ones in dirty-rect mode."""
+        if not self.dirty_rects or self.dirty.watch(
+                'notification', self.notification_box, self.notification_message):
+            self.show_notification(self.notification_message)
 
-        # Object labels
-        labels = ['Door', 'Box', 'Painting']
-        rects = [self.room1_objects['door'], self.room1_objects['box'], self.room1_objects['painting']]
-        
-        for label, rect in zip(labels, rects):
-            label_text = self.small_font.render(label, True, WHITE)
-            screen.blit(label_text, (rect.x + 20, rect.y - 30))
-
-    def draw_room2(self):
-        """Draws the second room with pixelated background."""
-        # Pixelated background with variation
-        for x in range(0, WIDTH, 20):
-            for y in range(0, HEIGHT, 20):
-                color = (
-                    max(0, BLACK[0] + random.randint(-30, 30)),
-                    max(0, BLACK[1] + random.randint(-30, 30)),
-                    max(0, BLACK[2] + random.randint(-30, 30))
-                )
-                pygame.draw.rect(screen, color, pygame.Rect(x, y, 20, 20))
+        if self.input_active:
+            if not self.dirty_rects or self.dirty.watch('input', self.input_box, self.user_input):
+                self.show_input_box()
+        elif self.dirty_rects and self.dirty.watch('input', self.input_box, None):
+            self.screen.blit(self.backdrop, self.input_box, self.input_box)
 
-        # Draw pixelated door
-        PixelRenderer.draw_pixelated_door(screen, self.room2_objects['door'])
-        
-        # Puzzle device
-        PixelRenderer.draw_pixelated_rect(screen, RED, self.room2_objects['puzzle_device'], pixel_size=12)
+    def present(self):
+        """Pushes the finished frame to the display."""
+        if not self.dirty_rects:
+            pygame.display.flip()
+            return
+        rects = self.dirty.pop()
+        if rects:
+            pygame.display.update(rects)
 
-        # Lion head interaction
-        if self.lion_head_appeared:
-            self.draw_pixelated_lion_head(screen)
+    def draw_background(self, amplitude, surface=None):
+        """Draws the flickering pixelated static behind every room."""
+        self.noise.draw(self.screen if surface is None else surface, amplitude)
 
-        # Object labels
-        labels = ['Exit Door', 'Puzzle Device']
-        rects = [self.room2_objects['door'], self.room2_objects['puzzle_device']]
-        
-        for label, rect in zip(labels, rects):
-            label_text = self.small_font.render(label, True, WHITE)
-            screen.blit(label_text, (rect.x + 20, rect.y - 30))
-
-    def draw_room3(self):
-        """Draws the third room with the key item and hologram reveal"""
-        # Pixelated background with variation
-        for x in range(0, WIDTH, 20):
-            for y in range(0, HEIGHT, 20):
-                color = (
-                    max(0, BLACK[0] + random.randint(-30, 30)),
-                    max(0, BLACK[1] + random.randint(-30, 30)),
-                    max(0, BLACK[2] + random.randint(-30, 30))
-                )
-                pygame.draw.rect(screen, color, pygame.Rect(x, y, 20, 20))
+    def draw_labels(self, surface, room=None, flags=None):
+        """Draws a room's object labels just above their rects."""
+        for label, rect in self.room_labels(room, flags):
+            label_text = self.text.render(self.small_font, label, WHITE)
+            surface.blit(label_text, (rect.x + 20, rect.y - 30))
 
-        # Pixelated key with glitch effect
-        key_rect = self.room2_objects['key_item']
-        PixelRenderer.draw_pixelated_rect(screen, YELLOW, key_rect, pixel_size=8)
-        
-        # Glitch effect on key
-        for _ in range(10):
-            glitch_x = key_rect.left + random.randint(0, key_rect.width)
-            glitch_y = key_rect.top + random.randint(0, key_rect.height)
-            glitch_color = (
-                random.randint(200, 255),
-                random.randint(200, 255),
-                random.randint(200, 255)
-            )
-            pygame.draw.rect(screen, glitch_color, 
-                pygame.Rect(glitch_x, glitch_y, 10, 10))
+    def room_labels(self, room=None, flags=None):
+        """Returns (label, rect) pairs for a room's objects, by default the current room's."""
+        room = self.room if room is None else room
+        return [(obj['label'], obj['rect']) for obj in room.objects
+                if 'label' in obj and self.visible(obj, flags)]
+
+    def room_state(self, room=None, flags=None):
+        """Returns the object state that a room's static layer depends on."""
+        room = self.room if room is None else room
+        flags = self.flags if flags is None else flags
+        return tuple(flag in flags for flag in room.visibility_flags)
+
+    def preload_next_rooms(self):
+        """Prepares the rooms reachable from the current one on the preloader thread."""
+        self.preloaded_from = self.current_room
+        flags = frozenset(self.flags)
+        renderer = self.canvas_renderer
+        if renderer is not None:
+            cache, size, builder = renderer.layer_cache, renderer.canvas.get_size(), renderer.build_layer
+            font = renderer.font
+        else:
+            cache, size, builder = self.layer_cache, self.screen.get_size(), self.build_room_layer
+            font = self.small_font
+
+        for room_id in self.room.exits:
+            def work(room_id=room_id):
+                room = self.pack.room(room_id)
+                state = self.room_state(room, flags)
+                layer = LayerCache.build(size, lambda surface: builder(surface, room, flags))
+                for text in room.messages:
+                    self.text.render(font, text, WHITE)
+                return room_id, state, layer
+
+            self.preloader.submit('preload room %s' % room_id, work,
+                                  lambda result, cache=cache: cache.store(*result))
+
+    def blit_static_layer(self, builder, surface=None):
+        """Blits the cached static layer of the current room and returns its rect."""
+        surface = self.screen if surface is None else surface
+        layer, offset = self.layer_cache.get(
+            self.current_room, self.room_state(), surface.get_size(), builder
+        )
+        return surface.blit(layer, offset)
+
+    def draw_backdrop(self, amplitude, builder):
+        """Draws background static and the static layer, refreshing them at the background rate."""
+        now = self.clock()
+        key = (self.current_room, self.room_state())
+        room_changed = self.backdrop_key is None or key[0] != self.backdrop_key[0]
+        flicker_due = (self.background_interval is not None
+                       and now - self.backdrop_time >= self.background_interval)
+
+        if room_changed or flicker_due or key != self.backdrop_key:
+            # The noise is new everywhere, so the whole screen takes the new backdrop;
+            # otherwise overlay_region would restore patches that no longer match
+            self.draw_background(amplitude, self.backdrop)
+            self.blit_static_layer(builder, self.backdrop)
+            self.screen.blit(self.backdrop, (0, 0))
+            self.dirty.mark(self.screen.get_rect())
+            self.dirty.reset()
+            self.backdrop_key = key
+            self.backdrop_time = now
+        elif not self.dirty_rects:
+            self.screen.blit(self.backdrop, (0, 0))
+
+    def overlay_region(self, rect):
+        """Restores an animated overlay's region from the backdrop in dirty-rect mode."""
+        if self.dirty_rects:
+            self.screen.blit(self.backdrop, rect, rect)
+            self.dirty.mark(rect)
+
+    def build_room_layer(self, surface, room=None, flags=None):
+        """Renders the static parts of a room, by default the current one."""
+        room = self.room if room is None else room
+
+        # Sprites come from the atlas in one batch, in drawing order
+        blits = []
+        for obj in room.objects:
+            if not obj.get('sprite') or not self.visible(obj, flags):
+                continue
+            blit = self.atlas.blit_args(obj)
+            if blit is not None:
+                blits.append(blit)
+                continue
+            surface.blits(blits, doreturn=False)
+            blits = []
+
+            # Not on the shared batch: this may run on the preloader thread
+            batch = DrawBatch()
+            PixelRenderer.draw_sprite(surface, obj, batch=batch)
+            batch.submit(surface)
+        surface.blits(blits, doreturn=False)
+
+        # Lion warnings and object labels
+        for obj in room.objects:
+            if 'warning' in obj and self.visible(obj, flags):
+                self.draw_warning(surface, obj)
+        self.draw_labels(surface, room, flags)
+
+    def draw_room(self):
+        """Draws the current room: pixelated backdrop, then its animated overlays."""
+        room = self.room
+        self.draw_backdrop(room.background, self.build_room_layer)
+
+        # Animated overlays; restore every region first so overlapping ones stay on top
+        overlays = [obj for obj in room.objects if 'overlay' in obj and self.visible(obj)]
+        for obj in overlays:
+            self.overlay_region(self.overlay_rect(obj))
+        for obj in overlays:
+            self.draw_overlay(obj)
+        self.batch.submit(self.screen)
+
+        # Pixel glitch over the key, inside the region restored next frame
+        for obj in overlays:
+            if obj['overlay'] == 'key_glitch':
+                self.object_glitch.apply(self.screen, self.glitch_detail, self.overlay_rect(obj), self.profiler)
+
+    @staticmethod
+    def overlay_rect(obj):
+        """The area an object's animated overlay can draw into."""
+        spill = OVERLAY_SPILL.get(obj['overlay'], 0)
+        rect = obj['rect']
+        return pygame.Rect(rect.left, rect.top, rect.width + spill, rect.height + spill)
+
+    def draw_overlay(self, obj):
+        """Queues one object's animated overlay for this frame's batch."""
+        overlay = obj['overlay']
+        rect = obj['rect']
+        count = self.glitch_count(10)
+        if overlay == 'painting_marks':
+            PixelRenderer.draw_painting_marks(self.screen, rect, count=count, batch=self.batch)
+        elif overlay == 'color_noise':
+            PixelRenderer.draw_color_block_noise(self.screen, [rect], self.noise, colors=[obj['color']],
+                                                 count=count, batch=self.batch)
+        elif overlay == 'key_glitch':
+            PixelRenderer.draw_key_glitch(self.screen, rect, count=count, batch=self.batch)
+        else:
+            raise ValueError("Unknown overlay: %r" % overlay)
+
+    def handle_event(self, event):
+        """Applies one pygame event to the game."""
+        if event.type == pygame.QUIT:
+            self.close()
+            pygame.quit()
+            sys.exit()
+
+        if event.type == pygame.MOUSEBUTTONDOWN:
+            self.click(self.to_logical(event.pos))
+
+        # Profiler overlay toggle
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+            self.toggle_profiler_overlay()
+            return
+
+        # Input handling
+        if event.type == pygame.KEYDOWN and self.input_active:
+            if event.key == pygame.K_RETURN:
+                self.submit()
+            elif event.key == pygame.K_BACKSPACE:
+                self.backspace()
+            else:
+                self.type_text(event.unicode)
+
+    def to_logical(self, pos):
+        """Maps a window position to game coordinates."""
+        if self.canvas_renderer is None:
+            return pos
+        return self.canvas_renderer.to_logical(pos)
+
+    def set_profiling(self, enabled):
+        """Turns frame-time recording on or off, including per-call PixelRenderer timings."""
+        self.profiler.enable(enabled)
+        if enabled:
+            self.profiler.instrument(PixelRenderer,
+                                     [name for name in vars(PixelRenderer) if name.startswith('draw_')])
+        else:
+            self.profiler.uninstrument()
+
+    def toggle_profiler_overlay(self):
+        """Shows or hides the frame-time overlay (F3)."""
+        self.profiler.overlay = not self.profiler.overlay
+        if self.profiler.overlay:
+            self.set_profiling(True)
+        else:
+            if not self.profile_path:
+                self.set_profiling(False)
+            if self.profiler_rect is not None:
+                self.overlay_region(self.profiler_rect)
+                self.profiler_rect = None
+
+    def draw_profiler_overlay(self):
+        """Draws the frame-time overlay in the top-left corner."""
+        if self.profiler_rect is not None:
+            self.overlay_region(self.profiler_rect)
+        self.profiler_rect = self.profiler.draw_overlay(self.screen, self.small_font)
+        if self.dirty_rects:
+            self.dirty.mark(self.profiler_rect)
+
+    def close(self):
+        """Stops the background threads the game started."""
+        if self.preloader is not None:
+            self.preloader.stop()
+
+    def apply_quality(self, level):
+        """Sets noise, glitch, background and crawl detail to a quality level."""
+        settings = QUALITY_LEVELS[level]
+        self.quality_level = level
+        self.noise.set_cell_size(settings['noise_cell'])
+        if self.canvas_renderer is not None:
+            self.canvas_renderer.noise.set_cell_size(max(1, settings['noise_cell'] // self.canvas_renderer.scale))
+        self.glitch_detail = settings['glitch']
+        self.crawl_jitter = settings['jitter']
+
+        # Slower background refresh, but never faster than asked for
+        interval = self.base_background_interval
+        if settings['background_hz'] is not None and interval is not None:
+            interval = max(interval, 1000 / settings['background_hz'])
+        self.background_interval = interval
+        self.profiler.tags['quality'] = settings['name']
+
+    def glitch_count(self, count):
+        """How many of count glitch squares to draw at the current quality."""
+        return max(1, round(count * self.glitch_detail))
+
+    def adapt_quality(self, frame_start):
+        """Feeds this frame's work time to the quality controller and applies its level."""
+        self.quality.add((time.perf_counter() - frame_start) * 1000)
+        # A replayed session uses the levels it was recorded with
+        level = self.input.quality_level(self.quality.level)
+        if level != self.quality_level:
+            self.quality.set_level(level)
+            self.apply_quality(level)
 
     def game_loop(self):
-        clock = pygame.time.Clock()
+        profiler = self.profiler
         while not self.escaped:
-            # Draw current room
-            if self.current_room == 1:
-                self.draw_room1()
-            elif self.current_room == 2:
-                self.draw_room2()
-            else:
-                self.draw_room3()
+            self.input.begin_frame()
+            frame_start = time.perf_counter()
+            profiler.begin_frame()
 
-                # Key item interaction with hologram plot twist
-                mouse_pos = pygame.mouse.get_pos()
-                if self.room2_objects['key_item'].collidepoint(mouse_pos):
-                    self.key_is_hologram = True
-                    self.hologram_reveal_timer = pygame.time.get_ticks()
-                    self.notification_message = "The key... it's changing! Is this real?"
+            # Pick up preloaded rooms, and start on the next ones after a move
+            if self.preloader is not None:
+                with profiler.phase('preload'):
+                    self.preloader.collect()
+                    if self.preloaded_from != self.current_room:
+                        self.preload_next_rooms()
 
-                # Plot twist reveal
-                if self.key_is_hologram and pygame.time.get_ticks() - self.hologram_reveal_timer > 2000:
-                    self.dramatic_escape_sequence()
+            # Draw current room
+            with profiler.phase('room'):
+                if self.canvas_renderer is not None:
+                    self.canvas_renderer.draw_frame()
+                else:
+                    self.draw_room()
 
-            # Show notification
-            self.show_notification(self.notification_message)
+            # Hologram key and plot twist timers
+            with profiler.phase('update'):
+                self.update(self.to_logical(self.input.mouse_pos()))
+            if self.revealed:
+                self.dramatic_escape_sequence()
 
-            # Show input box if active
-            if self.input_active:
-                self.show_input_box()
+            # Show notification and input box if active
+            if self.canvas_renderer is None:
+                with profiler.phase('ui'):
+                    self.draw_ui()
 
             # Event handling
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit()
+            with profiler.phase('events'):
+                for event in self.input.events():
+                    self.handle_event(event)
 
-                if event.type == pygame.MOUSEBUTTONDOWN:
-                    mouse_pos = pygame.mouse.get_pos()
-
-                    if self.current_room == 1:
-                        # Box interaction
-                        if self.room1_objects['box'].collidepoint(mouse_pos):
-                            if not self.riddle_solved:
-                                self.notification_message = "Riddle:'Another one?? Fine...my hardest one.... only asked 23 times 'What speaks without a mouth?' "
-                                self.input_active = True
-                            else:
-                                self.notification_message = "The box is empty now."
-
-                        # Painting interaction
-                        elif self.room1_objects['painting'].collidepoint(mouse_pos):
-                            self.notification_message = "There's a note attached...It says 'Start with 1'"
-
-                        # Color block interactions
-                        for block in self.room1_objects['color_blocks']:
-                            if block.collidepoint(mouse_pos):
-                                self.color_sequence_input.append(
-                                    RED if block == self.room1_objects['color_blocks'][0] else
-                                    GREEN if block == self.room1_objects['color_blocks'][1] else
-                                    BLUE
-                                )
-
-                        # Color sequence check
-                        if self.color_sequence_input == self.color_sequence:
-                            self.notification_message = "You solved the painting puzzle! Found a clue!"
-                        elif len(self.color_sequence_input) > len(self.color_sequence):
-                            self.notification_message = "Incorrect sequence. Try again!"
-                            self.color_sequence_input = []
-
-                        # Door interaction
-                        if self.room1_objects['door'].collidepoint(mouse_pos):
-                            if not self.keypad_solved:
-                                self.notification_message = "Enter the 4-digit code."
-                                self.input_active = True
-                            else:
-                                self.current_room = 2
-                                self.notification_message = "Entering Room 2..."
-
-                    elif self.current_room == 2:
-                        # Puzzle device interaction
-                        if self.room2_objects['puzzle_device'].collidepoint(mouse_pos):
-                            self.lion_head_appeared = True
-                            self.notification_message = "You see a strange device...You touch it...Your head appears!"
-                            self.lion_warning_timer = pygame.time.get_ticks()
-
-                        # Door interaction
-                        if self.room2_objects['door'].collidepoint(mouse_pos):
-                            self.current_room = 3
-                            self.notification_message = "Final Room... something feels different..."
-
-                    # Plot twist in Room 3
-                    elif self.current_room == 3:
-                        if self.room2_objects['door'].collidepoint(mouse_pos):
-                            self.escaped = True
-
-                # Input handling
-                if event.type == pygame.KEYDOWN and self.input_active:
-                    if event.key == pygame.K_RETURN:
-                        self.input_active = False
-                        if "Riddle" in self.notification_message:
-                            if self.user_input.lower() == "echo":
-                                self.riddle_solved = True
-                                self.key_found = True
-                                self.notification_message = "Correct! You found a key and a note....'End with 4'"
-                            else:
-                                self.notification_message = "Incorrect! Try again."
-                        elif "code" in self.notification_message.lower():
-                            if self.user_input == "1234":
-                                self.keypad_solved = True
-                                self.door_unlocked = True
-                                self.notification_message = "Correct! The door is unlocked!"
-                            else:
-                                self.notification_message = "Wrong code. Try again."
-                        self.user_input = ""
-                    elif event.key == pygame.K_BACKSPACE:
-                        self.user_input = self.user_input[:-1]
-                    else:
-                        self.user_input += event.unicode
+            if profiler.overlay:
+                with profiler.phase('overlay'):
+                    self.draw_profiler_overlay()
 
-            pygame.display.flip()
-            clock.tick(60)
+            with profiler.phase('present'):
+                self.present()
+            if self.capture is not None:
+                with profiler.phase('capture'):
+                    self.capture.grab(self.screen)
+            self.adapt_quality(frame_start)
+            profiler.end_frame()
+            self.input.end_frame(self.screen)
 
         # Victory screen
-        screen.fill(BLACK)
-        victory_text = self.font.render("YOU LOSE.....aint that easy", True, WHITE)
-        text_rect = victory_text.get_rect(center=(WIDTH//2, HEIGHT//2))
-        screen.blit(victory_text, text_rect)
+        self.screen.fill(BLACK)
+        victory_text = self.text.render(self.font, "YOU LOSE.....aint that easy", WHITE)
+        text_rect = victory_text.get_rect(center=self.screen.get_rect().center)
+        self.screen.blit(victory_text, text_rect)
         pygame.display.flip()
         pygame.time.wait(3000)
+        self.close()
         pygame.quit()
         sys.exit()
 
 def main():
-    game = EscapeRoom()
+    parser = argparse.ArgumentParser(description="Pixel Escape Room: The Quantum Paradox")
+    parser.add_argument('--dirty-rects', action='store_true',
+                        help="only push changed screen regions instead of flipping every frame")
+    parser.add_argument('--background-hz', type=float, default=None,
+                        help="background flicker rate (default: every frame, 10 with --dirty-rects, 0 = still)")
+    parser.add_argument('--profile', metavar='PATH',
+                        help="record frame timings and write them to PATH (.csv or .json) on exit; F3 shows the overlay")
+    parser.add_argument('--lowres', type=int, nargs='?', const=10, default=None, metavar='SCALE',
+                        help="draw into a 1/SCALE canvas (default 10) and upscale it to the window")
+    parser.add_argument('--window-size', metavar='WxH',
+                        help="window size for --lowres, e.g. 1920x1080")
+    parser.add_argument('--no-preload', action='store_true',
+                        help="build each room when it is entered instead of in the background")
+    parser.add_argument('--quality', choices=['auto'] + QUALITY_NAMES, default='auto',
+                        help="effect detail; auto lowers it while frames run over budget (default)")
+    parser.add_argument('--quality-log', metavar='PATH',
+                        help="append every quality level change to PATH as a JSON line")
+    parser.add_argument('--capture', metavar='DIR',
+                        help="save every frame to DIR without slowing the game (frames are dropped instead)")
+    parser.add_argument('--capture-format', choices=['png', 'raw'], default='png',
+                        help="a PNG per frame, or one raw video file for ffmpeg (see DIR/frames.json)")
+    parser.add_argument('--seed', type=int, default=None,
+                        help="seed every random effect, for reproducible frames")
+    parser.add_argument('--record', metavar='PATH',
+                        help="write this session's input and seed to a log that --replay can play back")
+    parser.add_argument('--checksums', action='store_true',
+                        help="with --record, also log a checksum of every frame so replays can be verified")
+    parser.add_argument('--replay', metavar='PATH',
+                        help="play back a session log recorded with --record (its options replace these)")
+    parser.add_argument('--replay-speed', choices=['realtime', 'max'], default='realtime',
+                        help="replay at the recorded pace or as fast as possible")
+    parser.add_argument('--build-atlas', action='store_true',
+                        help="rasterize the sprite atlas for the bundled rooms and exit")
+    args = parser.parse_args()
+    if args.build_atlas:
+        atlas = SpriteAtlas.load(default_pack())
+        print("%d sprites, sheet %dx%d" % ((len(atlas.index),) + atlas.sheet.get_size()))
+        return
+    if args.window_size and not args.lowres:
+        parser.error("--window-size needs --lowres")
+    if args.lowres and args.dirty_rects:
+        parser.error("--lowres redraws the whole window every frame and cannot be combined with --dirty-rects")
+    if args.record and args.replay:
+        parser.error("--record and --replay cannot be combined")
+
+    background_hz = args.background_hz
+    if background_hz is None and args.dirty_rects:
+        background_hz = 10
+    settings = {'dirty_rects': args.dirty_rects, 'background_hz': background_hz,
+                'lowres': args.lowres, 'window_size': args.window_size, 'quality': args.quality}
+    seed = args.seed
+
+    # Session recording and replay
+    input_source = None
+    if args.replay:
+        input_source = SessionPlayer(args.replay, realtime=args.replay_speed == 'realtime')
+        # Logs from before quality levels were drawn at full quality
+        settings = dict(settings, quality='full')
+        settings, seed = dict(settings, **input_source.settings), input_source.seed
+        atexit.register(lambda: print(input_source.report()))
+    elif args.record:
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        input_source = SessionRecorder(args.record, seed, settings, checksums=args.checksums)
+        atexit.register(input_source.close)
+    if seed is not None:
+        random.seed(seed)
+
+    surface = None
+    if settings['window_size']:
+        surface = init_display(tuple(int(v) for v in settings['window_size'].split('x')))
+
+    game = EscapeRoom(surface=surface, seed=seed, dirty_rects=settings['dirty_rects'],
+                      background_hz=settings['background_hz'], profile_path=args.profile,
+                      lowres_scale=settings['lowres'], preload=not args.no_preload,
+                      input_source=input_source, quality=settings['quality'], quality_log=args.quality_log,
+                      capture_path=args.capture, capture_format=args.capture_format)
+    atexit.register(game.quality.close)
     game.game_loop()
 
 if __name__ == "__main__":
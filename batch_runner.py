@@ -0,0 +1,216 @@
+"""Batch playthroughs of the puzzle flow over a process pool.
+
+Every worker plays headless games (see game_state.py) from randomized or
+scripted input traces and sends back only aggregated counts for its chunk,
+so memory stays flat however many traces are run. Per-trace outcomes can be
+streamed to a JSON-lines file as chunks finish.
+
+    python batch_runner.py --traces 100000 --workers 8 --stream outcomes.jsonl
+    python batch_runner.py --traces-file traces.jsonl
+
+A traces file holds one trace per line as a JSON list of events, e.g.
+    [["click", [200, 500]], ["text", "echo"], ["enter"]]
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+# Keep pygame's import banner out of the JSON summary on stdout
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+from content import default_pack, reopen_default_pack
+from game_state import GameState, ManualClock, run_headless, hotspots, hologram_reveal_ms, key_hotspot
+
+ANSWERS = ['echo', 'Echo', '1234', 'mouth', '4321', 'wind']
+
+
+def random_trace(rng, length):
+    """Build a randomized input trace biased towards the interactive objects"""
+    # Points inside the interactive objects, so random clicks hit something useful
+    targets, key, reveal_ms = hotspots(), key_hotspot(), hologram_reveal_ms()
+    trace = []
+    for _ in range(length):
+        roll = rng.random()
+        if roll < 0.45:
+            trace.append(('click', rng.choice(targets)))
+        elif roll < 0.55:
+            trace.append(('click', (rng.randrange(1024), rng.randrange(668))))
+        elif roll < 0.70:
+            trace.append(('text', rng.choice(ANSWERS)))
+        elif roll < 0.85:
+            trace.append(('enter',))
+        elif roll < 0.88:
+            trace.append(('backspace',))
+        elif roll < 0.93:
+            trace.append(('hover', key))
+        elif roll < 0.95:
+            trace.append(('hover', (rng.randrange(1024), rng.randrange(668))))
+        else:
+            trace.append(('wait', rng.randint(100, reveal_ms + 1000)))
+    return trace
+
+
+class OutcomeStats:
+    """Aggregated results of many playthroughs; cheap to merge across workers"""
+    def __init__(self):
+        self.runs = 0
+        self.revealed = 0
+        self.escaped = 0
+        self.steps_to_finish = Counter()
+        self.stuck_messages = Counter()
+        self.rooms_reached = Counter()
+
+    def add(self, state, steps):
+        self.runs += 1
+        self.rooms_reached[state.current_room] += 1
+        if state.revealed:
+            self.revealed += 1
+        elif state.escaped:
+            self.escaped += 1
+        else:
+            self.stuck_messages[state.notification_message] += 1
+            return
+        self.steps_to_finish[steps] += 1
+
+    def merge(self, other):
+        self.runs += other.runs
+        self.revealed += other.revealed
+        self.escaped += other.escaped
+        self.steps_to_finish.update(other.steps_to_finish)
+        self.stuck_messages.update(other.stuck_messages)
+        self.rooms_reached.update(other.rooms_reached)
+
+    def percentile(self, fraction):
+        """Steps-to-finish percentile from the histogram, or None if nothing finished"""
+        total = sum(self.steps_to_finish.values())
+        if not total:
+            return None
+        threshold = fraction * total
+        seen = 0
+        for steps in sorted(self.steps_to_finish):
+            seen += self.steps_to_finish[steps]
+            if seen >= threshold:
+                return steps
+
+    def summary(self, top=10):
+        finished = self.revealed + self.escaped
+        return {
+            'runs': self.runs,
+            'completion_rate': finished / self.runs if self.runs else 0.0,
+            'revealed': self.revealed,
+            'escaped': self.escaped,
+            'steps_to_finish': {
+                'p50': self.percentile(0.50),
+                'p90': self.percentile(0.90),
+                'p99': self.percentile(0.99),
+                'histogram': {str(k): v for k, v in sorted(self.steps_to_finish.items())},
+            },
+            'rooms_reached': {str(k): v for k, v in sorted(self.rooms_reached.items())},
+            'stuck_messages': dict(self.stuck_messages.most_common(top)),
+        }
+
+
+def play_chunk(job):
+    """Worker: play one chunk of traces and return (stats, per-trace rows)"""
+    traces, length, keep_rows = job
+    stats = OutcomeStats()
+    rows = []
+    for trace_id, trace in traces:
+        if isinstance(trace, int):
+            trace = random_trace(random.Random(trace), length)
+        state, steps = run_headless(trace, GameState(clock=ManualClock()))
+        stats.add(state, steps)
+        if keep_rows:
+            rows.append({
+                'trace': trace_id,
+                'steps': steps,
+                'room': state.current_room,
+                'outcome': 'revealed' if state.revealed else 'escaped' if state.escaped else 'stuck',
+                'message': state.notification_message,
+            })
+    return stats, rows
+
+
+def trace_source(args):
+    """Yield (trace_id, seed or event list) without materializing the whole batch"""
+    if args.traces_file:
+        with open(args.traces_file) as f:
+            for trace_id, line in enumerate(f):
+                if line.strip():
+                    yield trace_id, [tuple(tuple(v) if isinstance(v, list) else v for v in event)
+                                     for event in json.loads(line)]
+    else:
+        for trace_id in range(args.traces):
+            yield trace_id, args.seed * 1000003 + trace_id
+
+
+def run_batch(args, out=sys.stdout):
+    """Fan chunks out over the pool, merging and streaming results as they land"""
+    stats = OutcomeStats()
+    stream = open(args.stream, 'w') if args.stream else None
+    keep_rows = stream is not None
+    workers = args.workers or os.cpu_count() or 1
+    source = trace_source(args)
+    start = time.perf_counter()
+
+    try:
+        # Recompile a stale pack once here; each worker then reads rooms through its own file handle
+        default_pack()
+        with ProcessPoolExecutor(max_workers=workers, initializer=reopen_default_pack) as pool:
+            pending = set()
+            exhausted = False
+            while pending or not exhausted:
+                # Keep a couple of chunks queued per worker
+                while not exhausted and len(pending) < workers * 2:
+                    chunk = list(itertools.islice(source, args.chunk))
+                    if not chunk:
+                        exhausted = True
+                        break
+                    pending.add(pool.submit(play_chunk, (chunk, args.length, keep_rows)))
+                if not pending:
+                    break
+
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chunk_stats, rows = future.result()
+                    stats.merge(chunk_stats)
+                    for row in rows:
+                        stream.write(json.dumps(row) + '\n')
+                if not args.quiet:
+                    elapsed = time.perf_counter() - start
+                    print("%d runs, %.1f%% completed, %.0f runs/s" % (
+                        stats.runs, 100.0 * (stats.revealed + stats.escaped) / stats.runs,
+                        stats.runs / elapsed), file=sys.stderr)
+    finally:
+        if stream is not None:
+            stream.close()
+
+    summary = stats.summary()
+    summary['seconds'] = round(time.perf_counter() - start, 3)
+    summary['workers'] = workers
+    json.dump(summary, out, indent=2)
+    out.write('\n')
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run many headless escape room playthroughs in parallel")
+    parser.add_argument('--traces', type=int, default=10000, help="number of randomized traces")
+    parser.add_argument('--traces-file', help="JSON-lines file of scripted traces instead of random ones")
+    parser.add_argument('--length', type=int, default=80, help="events per randomized trace")
+    parser.add_argument('--seed', type=int, default=0, help="base seed for randomized traces")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('--chunk', type=int, default=500, help="traces per worker task")
+    parser.add_argument('--stream', help="write one JSON line per trace outcome to this file")
+    parser.add_argument('--quiet', action='store_true', help="no progress lines on stderr")
+    run_batch(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Per-frame cost of the room background static, before and after vectorizing.
+
+"Original" is the per-cell pygame.draw.rect loop the rooms used to run,
+"fallback" the NoiseGenerator path without numpy (one queued fill per
+cell) and "vectorized" the numpy path.
+
+Run from the repository root:
+    python benchmarks/bench_noise.py
+"""
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame
+import Escaperoom
+
+
+def original_static(surface, amplitude, base=Escaperoom.BLACK):
+    """The background as the rooms drew it before NoiseGenerator: a rect per 20px cell"""
+    for x in range(0, surface.get_width(), 20):
+        for y in range(0, surface.get_height(), 20):
+            color = (
+                max(0, base[0] + random.randint(-amplitude, amplitude)),
+                max(0, base[1] + random.randint(-amplitude, amplitude)),
+                max(0, base[2] + random.randint(-amplitude, amplitude))
+            )
+            pygame.draw.rect(surface, color, pygame.Rect(x, y, 20, 20))
+
+
+def time_frames(draw, surface, amplitude, frames):
+    """Return the median milliseconds spent drawing one background"""
+    timings = []
+    for _ in range(frames):
+        start = time.perf_counter()
+        draw(surface, amplitude)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def main(frames=200):
+    surface = pygame.Surface((Escaperoom.WIDTH, Escaperoom.HEIGHT))
+    # Separate generators, so the fallback one has its fill queue sized up front
+    cells = Escaperoom.NoiseGenerator(surface.get_size(), seed=1, vectorized=False)
+    noise = Escaperoom.NoiseGenerator(surface.get_size(), seed=1)
+    random.seed(1)
+
+    print("Background static, %dx%d, median of %d frames" % (
+        Escaperoom.WIDTH, Escaperoom.HEIGHT, frames))
+    for amplitude, rooms in ((20, "room 1"), (30, "rooms 2/3")):
+        before = time_frames(original_static, surface, amplitude, frames)
+        fallback = time_frames(cells.draw, surface, amplitude, frames)
+        line = "  %-9s original: %7.3f ms   fallback: %7.3f ms (%.1fx)" % (
+            rooms, before, fallback, before / fallback)
+        if noise.vectorized:
+            after = time_frames(noise.draw, surface, amplitude, frames)
+            line += "   vectorized: %7.3f ms (%.1fx)" % (after, before / after)
+        else:
+            line += "   vectorized: numpy not installed"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""Reproducible rendering benchmarks for PixelRenderer and the room drawing.
+
+Runs under SDL's dummy video driver (no window), seeds every random source,
+and times each call and a full frame at several resolutions. Results are
+written to JSON so two commits can be compared:
+
+    python benchmarks/bench_render.py --output before.json
+    ... change things ...
+    python benchmarks/bench_render.py --output after.json --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pygame
+import Escaperoom
+from Escaperoom import EscapeRoom, PixelRenderer
+
+RESOLUTIONS = [(640, 480), (1024, 768), (1920, 1080)]
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def measure(func, repeat, warmup=3):
+    """Time func() repeat times; return stats in milliseconds"""
+    for _ in range(warmup):
+        func()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        'median_ms': round(percentile(timings, 0.50), 4),
+        'p90_ms': round(percentile(timings, 0.90), 4),
+        'p99_ms': round(percentile(timings, 0.99), 4),
+        'mean_ms': round(sum(timings) / len(timings), 4),
+        'runs': len(timings),
+    }
+
+
+def frame(game, room):
+    """One full game frame without presenting it"""
+    game.current_room = room
+    game.draw_room()
+    game.draw_ui()
+
+
+def cases(game):
+    """(name, callable) pairs benchmarked at each resolution"""
+    surface = game.screen
+    room1 = game.pack.room(1)
+    door = room1.object('door')['rect']
+    box = room1.object('box')['rect']
+    painting = room1.object('painting')['rect']
+    blocks = [obj['rect'] for obj in room1.objects if obj.get('sprite') == 'color_block']
+    lion = game.pack.room(2).object('lion_head')
+
+    def room(n, cold=False):
+        def draw():
+            if cold:
+                game.layer_cache.invalidate()
+            game.current_room = n
+            game.draw_room()
+        return draw
+
+    def lion_room():
+        game.lion_head_appeared = True
+        room(2)()
+        game.lion_head_appeared = False
+
+    return [
+        ('PixelRenderer.draw_pixelated_rect', lambda: PixelRenderer.draw_pixelated_rect(surface, Escaperoom.RED, door)),
+        ('PixelRenderer.draw_pixelated_door', lambda: PixelRenderer.draw_pixelated_door(surface, door)),
+        ('PixelRenderer.draw_pixelated_box', lambda: PixelRenderer.draw_pixelated_box(surface, box)),
+        ('PixelRenderer.draw_pixelated_painting', lambda: PixelRenderer.draw_pixelated_painting(surface, painting)),
+        ('PixelRenderer.draw_color_blocks', lambda: PixelRenderer.draw_color_blocks(surface, blocks)),
+        ('EscapeRoom.draw_pixelated_lion_head', lambda: game.draw_pixelated_lion_head(surface, lion)),
+        ('EscapeRoom.draw_room1', room(1)),
+        ('EscapeRoom.draw_room2', room(2)),
+        ('EscapeRoom.draw_room2 (lion head)', lion_room),
+        ('EscapeRoom.draw_room3', room(3)),
+        ('EscapeRoom.draw_room1 (cold layers)', room(1, cold=True)),
+        ('EscapeRoom.draw_room2 (cold layers)', room(2, cold=True)),
+        ('EscapeRoom.draw_room3 (cold layers)', room(3, cold=True)),
+        ('EscapeRoom.draw_escape_frame', lambda: game.draw_escape_frame(200, 60)),
+        ('frame room 1', lambda: frame(game, 1)),
+        ('frame room 2', lambda: frame(game, 2)),
+        ('frame room 3', lambda: frame(game, 3)),
+    ]
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'pygame': pygame.version.ver,
+        'numpy': Escaperoom.numpy is not None,
+        'machine': platform.machine(),
+    }
+
+
+def run(resolutions, repeat, seed, only=None):
+    # A display, so layers and the atlas get converted to its pixel format as in the game
+    Escaperoom.init_display()
+    results = {}
+    for width, height in resolutions:
+        label = '%dx%d' % (width, height)
+        results[label] = {}
+        random.seed(seed)
+        game = EscapeRoom(surface=pygame.Surface((width, height)), seed=seed)
+        for name, func in cases(game):
+            if only and only not in name:
+                continue
+            random.seed(seed)
+            results[label][name] = measure(func, repeat)
+            print("%-10s %-42s median %8.3f ms   p90 %8.3f ms" % (
+                label, name, results[label][name]['median_ms'], results[label][name]['p90_ms']))
+        game.close()
+    return results
+
+
+def compare(results, baseline):
+    """Print median ratios against an earlier results file"""
+    print("\nmedian vs %s (commit %s)" % (baseline.get('path'), baseline['environment'].get('commit')))
+    for label, cases_ in results.items():
+        for name, stats in cases_.items():
+            old = baseline['results'].get(label, {}).get(name)
+            if not old:
+                continue
+            ratio = stats['median_ms'] / old['median_ms'] if old['median_ms'] else float('inf')
+            print("%-10s %-42s %8.3f -> %8.3f ms  (%.2fx)" % (
+                label, name, old['median_ms'], stats['median_ms'], ratio))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rendering benchmarks (SDL dummy driver)")
+    parser.add_argument('--resolutions', default=','.join('%dx%d' % r for r in RESOLUTIONS),
+                        help="comma-separated WxH list")
+    parser.add_argument('--repeat', type=int, default=100, help="timed runs per case")
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--only', help="only run cases whose name contains this")
+    parser.add_argument('--output', help="write results JSON here")
+    parser.add_argument('--compare', help="earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    resolutions = [tuple(int(v) for v in r.split('x')) for r in args.resolutions.split(',')]
+    results = run(resolutions, args.repeat, args.seed, args.only)
+    report = {
+        'environment': environment(),
+        'settings': {'repeat': args.repeat, 'seed': args.seed},
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        baseline['path'] = args.compare
+        compare(results, baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Load generator for server.py: many concurrent sessions solving the puzzles.
+
+Starts a server in a child process (or uses a running one), opens
+--sessions sessions spread over --connections connections and plays the
+scripted solution in all of them at once: each round sends one request per
+session, pipelined on every connection. Needs no display. Reports requests
+per second, round-trip percentiles and the server's memory per session:
+
+    python benchmarks/bench_server.py --sessions 2000 --connections 8
+    python benchmarks/bench_server.py --connect 127.0.0.1:8765 --output server.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from game_state import hologram_reveal_ms, solution
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+def script():
+    """The solution as server events; the hologram wait is real time, done separately"""
+    return [[event[0]] + [list(arg) if isinstance(arg, tuple) else arg for arg in event[1:]]
+            for event in solution() if event[0] != 'wait']
+
+
+class Connection:
+    """One client connection with pipelined request rounds"""
+    def __init__(self, reader, writer, latencies):
+        self.reader = reader
+        self.writer = writer
+        self.latencies = latencies
+        self.sessions = []
+
+    async def round(self, requests):
+        start = time.perf_counter()
+        self.writer.write(b''.join(json.dumps(request).encode('utf-8') + b'\n' for request in requests))
+        responses = [json.loads(await self.reader.readline()) for _ in requests]
+        self.latencies.append((time.perf_counter() - start) * 1000)
+        errors = [response['error'] for response in responses if 'error' in response]
+        if errors:
+            raise RuntimeError("server error: %s" % errors[0])
+        return responses
+
+    async def request(self, request):
+        return (await self.round([request]))[0]
+
+
+async def run(host, port, sessions, connections):
+    latencies = []
+    clients = []
+    for _ in range(connections):
+        reader, writer = await asyncio.open_connection(host, port)
+        clients.append(Connection(reader, writer, latencies))
+    before = await clients[0].request({'op': 'stats'})
+
+    # Open every session
+    start = time.perf_counter()
+    shares = [sessions // connections + (i < sessions % connections) for i in range(connections)]
+
+    async def open_sessions(client, count):
+        client.sessions = [r['session'] for r in await client.round([{'op': 'open'}] * count)]
+    await asyncio.gather(*[open_sessions(c, n) for c, n in zip(clients, shares)])
+    open_s = time.perf_counter() - start
+    opened = await clients[0].request({'op': 'stats'})
+
+    # Play the solution in every session, one event per session per round
+    del latencies[:]
+    events = script()
+    start = time.perf_counter()
+
+    async def play(client):
+        for event in events:
+            await client.round([{'op': 'event', 'session': s, 'event': event} for s in client.sessions])
+    await asyncio.gather(*[play(c) for c in clients])
+    play_s = time.perf_counter() - start
+    rounds = sorted(latencies)
+
+    # Let the hologram timer run out, then check every session got to the end
+    await asyncio.sleep(hologram_reveal_ms() / 1000 + 0.1)
+
+    async def finish(client):
+        responses = await client.round([{'op': 'poll', 'session': s} for s in client.sessions])
+        return sum(1 for r in responses if r['diff'].get('revealed'))
+    revealed = sum(await asyncio.gather(*[finish(c) for c in clients]))
+
+    for client in clients:
+        client.writer.close()
+    requests = sessions * len(events)
+    result = {
+        'sessions': sessions,
+        'connections': connections,
+        'open_per_s': round(sessions / open_s),
+        'requests': requests,
+        'requests_per_s': round(requests / play_s),
+        'round_p50_ms': round(percentile(rounds, 0.50), 3),
+        'round_p99_ms': round(percentile(rounds, 0.99), 3),
+        'revealed': revealed,
+    }
+    if 'max_rss_kb' in before:
+        result['server_kb_per_session'] = round((opened['max_rss_kb'] - before['max_rss_kb']) / sessions, 3)
+    return result
+
+
+def start_server():
+    """Run server.py on a free port; returns (process, port)"""
+    env = dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT='1')
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, 'server.py'), '--port', '0'],
+                               stdout=subprocess.PIPE, text=True, env=env)
+    for line in process.stdout:
+        if line.startswith('listening on'):
+            return process, int(line.rsplit(':', 1)[1])
+    raise RuntimeError("server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for the session server")
+    parser.add_argument('--sessions', type=int, default=2000)
+    parser.add_argument('--connections', type=int, default=4)
+    parser.add_argument('--connect', metavar='HOST:PORT', help="use a running server instead of starting one")
+    parser.add_argument('--output', help="write results JSON here")
+    args = parser.parse_args()
+
+    process = None
+    if args.connect:
+        host, port = args.connect.rsplit(':', 1)
+        port = int(port)
+    else:
+        process, port = start_server()
+        host = '127.0.0.1'
+    try:
+        result = asyncio.run(run(host, port, args.sessions, min(args.connections, args.sessions)))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    for key, value in result.items():
+        print("%-24s %s" % (key, value))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    if result['revealed'] != result['sessions']:
+        sys.exit("only %d of %d sessions finished" % (result['revealed'], result['sessions']))
+
+
+if __name__ == "__main__":
+    main()
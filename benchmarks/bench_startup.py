@@ -0,0 +1,127 @@
+"""Cold-start benchmark: import time, setup time and time to the first frame.
+
+Every run is a fresh interpreter under SDL's dummy video driver. It times
+importing Escaperoom, constructing the game and the game loop up to the
+first presented frame, and records which pygame subsystems were running
+after the import (there should be none) and after the first frame (only
+display and font), and which content files the import opened (there should
+be none; the room pack is loaded by the first game). Exits non-zero if the
+median time to the first frame is over budget or the import started or
+opened anything:
+
+    python benchmarks/bench_startup.py --runs 10 --budget-ms 800 --output startup.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in each fresh interpreter; prints one JSON line
+CHILD = r'''
+import json, os, sys, time
+start = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+
+# Files opened under content/ (packs, sources, atlases), as the interpreter reports them
+content_dir = os.path.join(sys.argv[1], 'content')
+opened = []
+def audit(event, args):
+    if event == 'open' and isinstance(args[0], str) and os.path.abspath(args[0]).startswith(content_dir):
+        opened.append(os.path.relpath(args[0], sys.argv[1]))
+sys.addaudithook(audit)
+import pygame
+import pygame.mixer
+
+def subsystems():
+    running = [('pygame.init', pygame.get_init()), ('display', pygame.display.get_init()),
+               ('font', pygame.font.get_init()), ('mixer', pygame.mixer.get_init() is not None)]
+    return [name for name, on in running if on]
+
+def ms():
+    return round((time.perf_counter() - start) * 1000, 3)
+
+result = {'pygame_ms': ms()}
+import Escaperoom
+from session import LiveInput
+result['import_ms'] = ms()
+result['after_import'] = subsystems()
+result['import_opened'] = sorted(set(opened))
+
+class FirstFrame(LiveInput):
+    def end_frame(self, surface):
+        result['first_frame_ms'] = ms()
+        raise SystemExit
+
+game = Escaperoom.EscapeRoom(input_source=FirstFrame())
+result['setup_ms'] = ms()
+try:
+    game.game_loop()
+except SystemExit:
+    pass
+result['after_first_frame'] = subsystems()
+print(json.dumps(result))
+'''
+
+STAGES = ['pygame_ms', 'import_ms', 'setup_ms', 'first_frame_ms', 'process_ms']
+
+
+def run_once():
+    env = dict(os.environ, SDL_VIDEODRIVER='dummy', SDL_AUDIODRIVER='dummy', PYGAME_HIDE_SUPPORT_PROMPT='1')
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', CHILD, ROOT], env=env, cwd=ROOT,
+                            capture_output=True, text=True, check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result['process_ms'] = round((time.perf_counter() - start) * 1000, 3)
+    return result
+
+
+def median(values):
+    ordered = sorted(values)
+    return ordered[len(ordered) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start benchmark (SDL dummy driver)")
+    parser.add_argument('--runs', type=int, default=5, help="fresh interpreters to start")
+    parser.add_argument('--budget-ms', type=float, default=1000,
+                        help="fail if the median time to the first frame is over this")
+    parser.add_argument('--output', help="write results JSON here")
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+    report = {
+        'python': sys.version.split()[0],
+        'runs': runs,
+        'median': {stage: median([run[stage] for run in runs]) for stage in STAGES},
+        'after_import': runs[0]['after_import'],
+        'import_opened': runs[0]['import_opened'],
+        'after_first_frame': runs[0]['after_first_frame'],
+        'budget_ms': args.budget_ms,
+    }
+    for stage in STAGES:
+        print("%-16s median %8.1f ms" % (stage, report['median'][stage]))
+    print("running after import:      %s" % (', '.join(report['after_import']) or 'nothing'))
+    print("running after first frame: %s" % ', '.join(report['after_first_frame']))
+    print("opened by the import:      %s" % (', '.join(report['import_opened']) or 'nothing'))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    failures = []
+    if report['median']['first_frame_ms'] > args.budget_ms:
+        failures.append("first frame after %.1f ms, budget %.0f ms" % (
+            report['median']['first_frame_ms'], args.budget_ms))
+    if report['after_import']:
+        failures.append("importing Escaperoom started: %s" % ', '.join(report['after_import']))
+    if report['import_opened']:
+        failures.append("importing Escaperoom opened: %s" % ', '.join(report['import_opened']))
+    if failures:
+        sys.exit('; '.join(failures))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Frame capture to disk that never holds up the game loop.
+
+Each captured frame is blitted into one of a few preallocated surfaces of
+the screen's own format (a plain copy, nothing allocated) and handed to a
+writer thread. The writer encodes it as a PNG, or appends it to a raw video
+file, and gives the surface back. When every surface is still waiting to be
+written the frame is dropped and counted instead of waiting for the writer.
+
+    python Escaperoom.py --capture shots/                     # shots/frame_000001.png, ...
+    python Escaperoom.py --capture shots/ --capture-format raw
+    ffmpeg -f rawvideo -pix_fmt bgr0 -s 1024x768 -r 60 -i shots/frames.raw trailer.mp4
+
+Raw frames are written in the screen's pixel layout when it is a plain
+32-bit one, so they need no conversion at all; shots/frames.json gives the
+size, ffmpeg pixel format, how many frames were dropped and the numbers of
+the last few of them.
+"""
+import json
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+import zlib
+from collections import deque
+
+import pygame
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+FORMATS = ('png', 'raw')
+PNG_LEVEL = 1           # fast compression; captures are for editing, not shipping
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+RECENT_DROPS = 1000     # dropped frame numbers kept for frames.json
+
+
+def _png_chunk(tag, data):
+    return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+
+
+def write_png(path, width, height, scanlines):
+    """Write 8-bit RGB scanlines, each led by its filter byte, as a PNG"""
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    with open(path, 'wb') as f:
+        f.write(PNG_SIGNATURE + _png_chunk(b'IHDR', header)
+                + _png_chunk(b'IDAT', zlib.compress(scanlines, PNG_LEVEL)) + _png_chunk(b'IEND', b''))
+
+
+def channel_offsets(surface):
+    """Byte offsets of R, G and B in a packed 32-bit pixel, or None for other layouts"""
+    if surface.get_bytesize() != 4 or surface.get_pitch() != surface.get_width() * 4:
+        return None
+    offsets = []
+    for mask, shift in zip(surface.get_masks()[:3], surface.get_shifts()[:3]):
+        if mask != 0xff << shift or shift % 8:
+            return None
+        offsets.append(shift // 8 if sys.byteorder == 'little' else 3 - shift // 8)
+    return tuple(offsets)
+
+
+class FrameCapture:
+    """Copies frames into a ring of preallocated surfaces; a thread writes them out"""
+    def __init__(self, directory, template, format='png', slots=8, profiler=None, fps=60):
+        if format not in FORMATS:
+            raise ValueError("Unknown capture format: %r" % format)
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.format = format
+        self.size = template.get_size()
+        self.fps = fps
+        self.profiler = profiler
+
+        # Ring of frame buffers in the screen's format, so a grab is a plain copy
+        self.slots = [pygame.Surface(self.size, 0, template) for _ in range(slots)]
+        self.offsets = channel_offsets(self.slots[0])
+        self.free = queue.Queue()
+        for index in range(slots):
+            self.free.put(index)
+        self.pending = queue.Queue()
+
+        self.frame = 0
+        self.written = 0
+        self.dropped = 0
+        self.recent_drops = deque(maxlen=RECENT_DROPS)
+        self.error = None
+
+        self.raw = None
+        self.pix_fmt = None
+        if format == 'raw':
+            self.raw = open(os.path.join(directory, 'frames.raw'), 'wb')
+            self.pix_fmt = self.raw_pix_fmt()
+
+        self.thread = threading.Thread(target=self.run, name='frame-capture', daemon=True)
+        self.thread.start()
+
+    def raw_pix_fmt(self):
+        """ffmpeg name of the layout raw frames are written in"""
+        if self.offsets == (2, 1, 0):
+            return 'bgra' if self.slots[0].get_masks()[3] else 'bgr0'
+        if self.offsets == (0, 1, 2):
+            return 'rgba' if self.slots[0].get_masks()[3] else 'rgb0'
+        return 'rgb24'
+
+    def grab(self, surface):
+        """Queue a copy of the frame; returns False if it had to be dropped"""
+        self.frame += 1
+        try:
+            index = self.free.get_nowait()
+        except queue.Empty:
+            self.dropped += 1
+            self.recent_drops.append(self.frame)
+            return False
+        self.slots[index].blit(surface, (0, 0))
+        self.pending.put((index, self.frame))
+        return True
+
+    def run(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+            index, frame = item
+            start = time.perf_counter()
+            try:
+                if self.error is None:
+                    self.write(self.slots[index], frame)
+                    self.written += 1
+            except (OSError, pygame.error) as e:
+                # Keep emptying the queue so the game never waits on a broken writer
+                self.error = e
+            finally:
+                self.free.put(index)
+            if self.profiler is not None:
+                self.profiler.note('capture ' + self.format, (time.perf_counter() - start) * 1000)
+
+    def write(self, slot, frame):
+        if self.format == 'raw':
+            if self.pix_fmt == 'rgb24':
+                self.raw.write(pygame.image.tobytes(slot, 'RGB'))
+            else:
+                self.raw.write(slot.get_view('0'))
+            return
+        width, height = self.size
+        write_png(os.path.join(self.directory, 'frame_%06d.png' % frame), width, height, self.scanlines(slot))
+
+    def scanlines(self, slot):
+        """RGB rows of a frame, each led by a zero (no filter) byte"""
+        width, height = self.size
+        if numpy is not None and self.offsets is not None:
+            pixels = numpy.frombuffer(slot.get_view('0'), dtype=numpy.uint8).reshape(height, width, 4)
+            rows = numpy.zeros((height, 1 + width * 3), dtype=numpy.uint8)
+            rows[:, 1:] = pixels[:, :, list(self.offsets)].reshape(height, width * 3)
+            return rows.tobytes()
+        rgb = pygame.image.tobytes(slot, 'RGB')
+        stride = width * 3
+        return b''.join(b'\0' + rgb[y:y + stride] for y in range(0, len(rgb), stride))
+
+    def close(self):
+        """Write out every queued frame and stop the writer"""
+        if self.thread is None:
+            return
+        self.pending.put(None)
+        self.thread.join()
+        self.thread = None
+        if self.raw is not None:
+            self.raw.close()
+            with open(os.path.join(self.directory, 'frames.json'), 'w') as f:
+                json.dump({'width': self.size[0], 'height': self.size[1], 'pix_fmt': self.pix_fmt,
+                           'fps': self.fps, 'frames': self.written, 'dropped': self.dropped,
+                           'recent_drops': list(self.recent_drops)}, f)
+
+    def report(self):
+        line = "captured %d of %d frames to %s, %d dropped" % (
+            self.written, self.frame, self.directory, self.dropped)
+        if self.error is not None:
+            line += " (writing stopped: %s)" % self.error
+        return line
@@ -0,0 +1,329 @@
+"""Room and puzzle content packs.
+
+Rooms are written as JSON (see content/quantum_paradox.json) and compiled
+into a pack file: a small pickled header indexing one pickled record per
+room. Opening a pack only reads the header; each room is unpickled the
+first time it is entered and only a few rooms stay resident, so startup
+time and memory stay flat however many rooms a pack has.
+
+    python content.py compile content/quantum_paradox.json
+
+Objects in a room have an id, an optional rect (no rect = the whole room),
+an optional sprite/label/overlay for drawing and optional "click"/"hover"
+action lists. Actions are one-key objects:
+    {"say": text}                      show a notification
+    {"prompt": puzzle, "else": [...]}  ask a puzzle, or run "else" once solved
+    {"push": value}                    add to the sequence being entered
+    {"check_sequence": puzzle}         check the entered sequence
+    {"set": flag}                      set a state flag
+    {"start_timer": name}              remember the current time
+    {"goto": room}                     move to another room
+    {"escape": true} / {"reveal": true}  end the game
+"""
+import atexit
+import hashlib
+import io
+import json
+import os
+import pickle
+import struct
+import sys
+import threading
+from collections import OrderedDict
+
+import pygame
+
+FORMAT_VERSION = 1
+MAGIC = b'QGPACK%d\n' % FORMAT_VERSION
+CONTENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'content')
+DEFAULT_PACK = os.path.join(CONTENT_DIR, 'quantum_paradox.json')
+
+
+class SpatialIndex:
+    """Uniform grid that maps a point to the objects whose rects cover it.
+
+    Objects inserted without a rect cover the whole room. Queries return
+    hits in insertion order, so handlers run in the order they were added.
+    """
+    def __init__(self, cell_size=64):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.everywhere = []
+        self.count = 0
+
+    def insert(self, object_id, rect, payload):
+        entry = (self.count, object_id, rect, payload)
+        self.count += 1
+        if rect is None:
+            self.everywhere.append(entry)
+            return
+        size = self.cell_size
+        for cx in range(rect.left // size, (rect.right - 1) // size + 1):
+            for cy in range(rect.top // size, (rect.bottom - 1) // size + 1):
+                self.cells.setdefault((cx, cy), []).append(entry)
+
+    def query(self, pos):
+        """Return [(object_id, payload)] for every object at pos"""
+        size = self.cell_size
+        entries = self.cells.get((pos[0] // size, pos[1] // size))
+        if entries is None and not self.everywhere:
+            return []
+        hits = [entry for entry in entries or () if entry[2].collidepoint(pos)]
+        if self.everywhere:
+            hits.extend(self.everywhere)
+            hits.sort()
+        return [(entry[1], entry[3]) for entry in hits]
+
+
+class RoomRegistry:
+    """Interactive objects of one room: click and hover actions by position.
+
+    Payloads are action lists from the room definition, so one registry is
+    shared by every game.
+    """
+    def __init__(self, cell_size=64):
+        self.clicks = SpatialIndex(cell_size)
+        self.hovers = SpatialIndex(cell_size)
+
+    def on_click(self, object_id, rect, actions):
+        self.clicks.insert(object_id, rect, actions)
+
+    def on_hover(self, object_id, rect, actions):
+        self.hovers.insert(object_id, rect, actions)
+
+
+class Room:
+    """One loaded room: its objects, puzzles, timers and interaction registry"""
+    def __init__(self, record):
+        self.id = record['id']
+        self.background = record.get('background', 30)
+        self.objects = []
+        self.registry = RoomRegistry()
+        for obj in record['objects']:
+            obj = dict(obj)
+            obj['rect'] = pygame.Rect(obj['rect']) if obj.get('rect') else None
+            self.objects.append(obj)
+            if 'click' in obj:
+                self.registry.on_click(obj['id'], obj['rect'], obj['click'])
+            if 'hover' in obj:
+                self.registry.on_hover(obj['id'], obj['rect'], obj['hover'])
+        self.by_id = {obj['id']: obj for obj in self.objects}
+        self.puzzles = OrderedDict((puzzle['id'], puzzle) for puzzle in record.get('puzzles', []))
+        self.timers = record.get('timers', [])
+        # Flags that change what is drawn, for keying cached layers
+        self.visibility_flags = tuple(obj['visible_if'] for obj in self.objects if 'visible_if' in obj)
+
+        # Rooms this one leads to and every message it can show, for preloading
+        actions = list(_walk_actions(record))
+        self.exits = sorted({action['goto'] for action in actions if 'goto' in action})
+        self.messages = [action['say'] for action in actions if 'say' in action]
+        for puzzle in self.puzzles.values():
+            self.messages.extend(puzzle[key] for key in ('prompt', 'solved', 'wrong') if key in puzzle)
+
+    def object(self, object_id):
+        return self.by_id[object_id]
+
+
+def _walk_actions(record):
+    """Yield every action in a room record, including nested ones"""
+    pending = [obj.get(key, []) for obj in record['objects'] for key in ('click', 'hover')]
+    pending.extend(timer['then'] for timer in record.get('timers', []))
+    while pending:
+        for action in pending.pop():
+            yield action
+            for key in ('else', 'then'):
+                if key in action:
+                    pending.append(action[key])
+
+
+def _prepare_actions(actions):
+    """Turn pushed values into tuples so they compare equal to puzzle answers"""
+    prepared = []
+    for action in actions:
+        action = dict(action)
+        if isinstance(action.get('push'), list):
+            action['push'] = tuple(action['push'])
+        for key in ('else', 'then'):
+            if key in action:
+                action[key] = _prepare_actions(action[key])
+        prepared.append(action)
+    return prepared
+
+
+def _prepare_room(room):
+    """Normalize one JSON room into the record stored in the pack"""
+    objects = []
+    for obj in room['objects']:
+        obj = dict(obj)
+        if obj.get('rect'):
+            obj['rect'] = tuple(obj['rect'])
+        if 'color' in obj:
+            obj['color'] = tuple(obj['color'])
+        for key in ('click', 'hover'):
+            if key in obj:
+                obj[key] = _prepare_actions(obj[key])
+        objects.append(obj)
+    puzzles = []
+    for puzzle in room.get('puzzles', []):
+        puzzle = dict(puzzle)
+        if puzzle.get('type') == 'sequence':
+            puzzle['answer'] = [tuple(v) if isinstance(v, list) else v for v in puzzle['answer']]
+        puzzles.append(puzzle)
+    timers = [dict(timer, then=_prepare_actions(timer['then'])) for timer in room.get('timers', [])]
+    return dict(room, objects=objects, puzzles=puzzles, timers=timers)
+
+
+def compile_pack(source_path, pack_path=None):
+    """Compile a JSON room pack; write it to pack_path, or return the bytes"""
+    with open(source_path, 'rb') as f:
+        source = f.read()
+    definition = json.loads(source.decode('utf-8'))
+
+    blobs = []
+    rooms = {}
+    offset = 0
+    for room in definition['rooms']:
+        blob = pickle.dumps(_prepare_room(room), protocol=pickle.HIGHEST_PROTOCOL)
+        rooms[room['id']] = (offset, len(blob))
+        blobs.append(blob)
+        offset += len(blob)
+
+    header = pickle.dumps({
+        'name': definition.get('name', os.path.splitext(os.path.basename(source_path))[0]),
+        'start_room': definition.get('start_room', definition['rooms'][0]['id']),
+        'source_hash': source_hash(source),
+        'rooms': rooms,
+    }, protocol=pickle.HIGHEST_PROTOCOL)
+    data = MAGIC + struct.pack('<I', len(header)) + header + b''.join(blobs)
+    if pack_path is None:
+        return data
+    tmp_path = pack_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, pack_path)
+    return data
+
+
+def source_hash(source):
+    return hashlib.sha256(b'%d:' % FORMAT_VERSION + source).hexdigest()
+
+
+class ContentPack:
+    """A compiled pack; rooms are read and unpickled on first use.
+
+    At most max_rooms rooms stay resident (None keeps every room).
+    """
+    def __init__(self, stream, max_rooms=4):
+        self.stream = stream
+        self.lock = threading.Lock()
+        self.max_rooms = max_rooms
+        self.loaded = OrderedDict()
+
+        if stream.read(len(MAGIC)) != MAGIC:
+            raise ValueError("Not a room pack (or an older format)")
+        header_len, = struct.unpack('<I', stream.read(4))
+        header = pickle.loads(stream.read(header_len))
+        self.base = len(MAGIC) + 4 + header_len
+        self.name = header['name']
+        self.start_room = header['start_room']
+        self.source_hash = header['source_hash']
+        self.index = header['rooms']
+
+        # A pack cut short would otherwise only fail when a missing room is entered
+        end = self.base + max([offset + length for offset, length in self.index.values()] + [0])
+        if stream.seek(0, io.SEEK_END) < end:
+            raise ValueError("Room pack is truncated")
+
+    @classmethod
+    def open(cls, path, **kwargs):
+        stream = open(path, 'rb')
+        try:
+            return cls(stream, **kwargs)
+        except Exception:
+            stream.close()
+            raise
+
+    def room_ids(self):
+        return list(self.index)
+
+    def room(self, room_id):
+        """Return the Room, loading it from the pack if it is not resident.
+
+        Resident rooms are dropped least recently used first.
+        """
+        with self.lock:
+            room = self.loaded.get(room_id)
+            if room is not None:
+                self.loaded.move_to_end(room_id)
+                return room
+            offset, length = self.index[room_id]
+            self.stream.seek(self.base + offset)
+            room = Room(pickle.loads(self.stream.read(length)))
+            self.loaded[room_id] = room
+            while self.max_rooms is not None and len(self.loaded) > self.max_rooms:
+                self.loaded.popitem(last=False)
+            return room
+
+
+def load_pack(source_path, max_rooms=4):
+    """Open the compiled pack for a JSON source, (re)compiling it if stale.
+
+    The compiled pack sits next to the source with a .pack extension. If it
+    cannot be written there the pack is compiled in memory instead.
+    """
+    pack_path = os.path.splitext(source_path)[0] + '.pack'
+    with open(source_path, 'rb') as f:
+        expected = source_hash(f.read())
+    try:
+        pack = ContentPack.open(pack_path, max_rooms=max_rooms)
+        if pack.source_hash == expected:
+            return pack
+        pack.stream.close()
+    except (OSError, ValueError, EOFError, struct.error, pickle.UnpicklingError):
+        # Missing, corrupt or cut short: compile it again
+        pass
+    try:
+        compile_pack(source_path, pack_path)
+        return ContentPack.open(pack_path, max_rooms=max_rooms)
+    except OSError:
+        return ContentPack(io.BytesIO(compile_pack(source_path)), max_rooms=max_rooms)
+
+
+_default_pack = None
+
+
+def default_pack():
+    """The bundled three-room pack, opened once per process"""
+    global _default_pack
+    if _default_pack is None:
+        _default_pack = load_pack(DEFAULT_PACK)
+        atexit.register(_default_pack.stream.close)
+    return _default_pack
+
+
+def reopen_default_pack():
+    """Open the bundled pack afresh in this process.
+
+    A forked worker inherits the parent's pack and with it the file offset
+    of its stream, which every process would then seek and read at once.
+    """
+    global _default_pack
+    if _default_pack is not None:
+        _default_pack.stream.close()
+        _default_pack = None
+    return default_pack()
+
+
+def main(argv):
+    if len(argv) < 2 or argv[0] != 'compile':
+        print("usage: python content.py compile SOURCE.json [...]")
+        return 2
+    for source_path in argv[1:]:
+        pack_path = os.path.splitext(source_path)[0] + '.pack'
+        data = compile_pack(source_path, pack_path)
+        print("%s -> %s (%d bytes)" % (source_path, pack_path, len(data)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
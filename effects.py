@@ -0,0 +1,209 @@
+"""Post-processing glitch effects that run on a surface's pixels in place.
+
+An EffectChain takes numpy views of a surface (or part of one) once per
+frame and hands them to each of its effects in turn. No pixels are copied
+to Python objects, and each effect is a few whole-array operations, so a
+longer chain adds no Python loops over pixels:
+
+    ChannelShift     red and blue pulled apart sideways
+    ScanlineTear     horizontal bands of rows torn sideways
+    BlockDisplace    rectangles copied over other parts of the frame
+    Quantize         colors crushed to a few levels per channel
+
+Every effect has a budget in milliseconds. The chain keeps a running
+average of what each one costs; an effect over budget runs on every
+second frame, then every fourth and so on, and earns its frames back
+once it is well under budget again. Turn adaptive off for reproducible
+output (session recording and replay do).
+
+Needs numpy and a 32-bit surface; otherwise the chain does nothing.
+"""
+import time
+
+import pygame
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+MAX_EVERY = 8           # an effect over budget still runs at least every 8th frame
+COST_SMOOTHING = 0.1    # weight of the newest timing in the running average
+
+
+class PixelViews:
+    """In-place views of one surface: rgb is (x, y, 3) bytes, packed is (x, y) pixel words"""
+    __slots__ = ('rgb', 'packed', 'masks')
+
+    def __init__(self, surface):
+        self.rgb = pygame.surfarray.pixels3d(surface)
+        self.packed = pygame.surfarray.pixels2d(surface)
+        self.masks = surface.get_masks()
+
+
+class Effect:
+    """One glitch pass; strength (0..1) scales how much it disturbs"""
+    budget_ms = 1.0
+
+    def __init__(self, budget_ms=None):
+        if budget_ms is not None:
+            self.budget_ms = budget_ms
+        self.cost_ms = 0.0
+        self.every = 1
+
+    @property
+    def name(self):
+        return type(self).__name__
+
+    def apply(self, views, rng, strength):
+        raise NotImplementedError
+
+    def track(self, ms):
+        """Fold in one run's cost and adjust how often the effect runs"""
+        self.cost_ms += (ms - self.cost_ms) * COST_SMOOTHING
+        per_frame = self.cost_ms / self.every
+        if per_frame > self.budget_ms and self.every < MAX_EVERY:
+            self.every *= 2
+        elif per_frame < self.budget_ms / 2 and self.every > 1:
+            self.every //= 2
+
+
+class ChannelShift(Effect):
+    """Moves the red channel right and the blue channel left"""
+    budget_ms = 3.0
+
+    def __init__(self, max_shift=8, budget_ms=None):
+        Effect.__init__(self, budget_ms)
+        self.max_shift = max_shift
+
+    def apply(self, views, rng, strength):
+        shift = int(round(self.max_shift * strength))
+        rgb = views.rgb
+        if shift <= 0 or shift >= rgb.shape[0]:
+            return
+        rgb[shift:, :, 0] = rgb[:-shift, :, 0]
+        rgb[:-shift, :, 2] = rgb[shift:, :, 2]
+
+
+class ScanlineTear(Effect):
+    """Shifts a few bands of rows sideways, wrapping around"""
+    budget_ms = 1.0
+
+    def __init__(self, bands=6, max_height=12, max_offset=40, budget_ms=None):
+        Effect.__init__(self, budget_ms)
+        self.bands = bands
+        self.max_height = max_height
+        self.max_offset = max_offset
+
+    def apply(self, views, rng, strength):
+        packed = views.packed
+        width, height = packed.shape
+        count = int(round(self.bands * strength))
+        if count <= 0:
+            return
+        offset = max(1, int(self.max_offset * strength))
+        tops = rng.integers(0, height, size=count).tolist()
+        heights = rng.integers(1, self.max_height + 1, size=count).tolist()
+        shifts = rng.integers(-offset, offset + 1, size=count).tolist()
+        for top, rows, shift in zip(tops, heights, shifts):
+            band = packed[:, top:top + rows]
+            band[...] = numpy.roll(band, shift, axis=0)
+
+
+class BlockDisplace(Effect):
+    """Copies rectangles of the frame onto other places"""
+    budget_ms = 1.0
+
+    def __init__(self, blocks=6, max_size=48, budget_ms=None):
+        Effect.__init__(self, budget_ms)
+        self.blocks = blocks
+        self.max_size = max_size
+
+    def apply(self, views, rng, strength):
+        packed = views.packed
+        width, height = packed.shape
+        count = int(round(self.blocks * strength))
+        size = min(self.max_size, width, height)
+        if count <= 0 or size < 2:
+            return
+        sizes = rng.integers(1, size + 1, size=(count, 2)).tolist()
+        starts = rng.random((count, 4)).tolist()
+        for (w, h), (sx, sy, dx, dy) in zip(sizes, starts):
+            sx, dx = int(sx * (width - w)), int(dx * (width - w))
+            sy, dy = int(sy * (height - h)), int(dy * (height - h))
+            packed[dx:dx + w, dy:dy + h] = packed[sx:sx + w, sy:sy + h]
+
+
+class Quantize(Effect):
+    """Keeps only the top bits of each channel; stronger keeps fewer"""
+    budget_ms = 1.0
+
+    def __init__(self, min_bits=2, budget_ms=None):
+        Effect.__init__(self, budget_ms)
+        self.min_bits = min_bits
+
+    def apply(self, views, rng, strength):
+        bits = 8 - int(round((8 - self.min_bits) * strength))
+        if bits >= 8:
+            return
+        # The same top-bits byte in every channel; alpha is left alone
+        byte = (0xff << (8 - bits)) & 0xff
+        red, green, blue, alpha = views.masks
+        mask = alpha
+        for channel in (red, green, blue):
+            mask |= channel & (byte * 0x01010101)
+        numpy.bitwise_and(views.packed, numpy.uint32(mask), out=views.packed)
+
+
+class EffectChain:
+    """Runs effects in order over a surface's pixels, within their budgets"""
+    def __init__(self, effects, seed=None, adaptive=True):
+        self.effects = list(effects)
+        self.adaptive = adaptive
+        self.rng = numpy.random.default_rng(seed) if numpy is not None else None
+        self.frame = 0
+
+    def supports(self, surface):
+        return self.rng is not None and surface.get_bytesize() == 4
+
+    def apply(self, surface, strength=1.0, rect=None, profiler=None):
+        """Glitch the surface, or the part of it in rect, in place"""
+        if strength <= 0 or not self.supports(surface):
+            return
+        if rect is not None:
+            rect = rect.clip(surface.get_rect())
+            if not rect.width or not rect.height:
+                return
+            surface = surface.subsurface(rect)
+        views = PixelViews(surface)
+        try:
+            for effect in self.effects:
+                if self.frame % effect.every:
+                    continue
+                start = time.perf_counter()
+                effect.apply(views, self.rng, strength)
+                ms = (time.perf_counter() - start) * 1000
+                if self.adaptive:
+                    effect.track(ms)
+                if profiler is not None and profiler.enabled:
+                    profiler.add('effect ' + effect.name, ms)
+        finally:
+            # Release the views so the surface unlocks
+            del views
+        self.frame += 1
+
+    def report(self):
+        """(name, average ms, budget ms, runs every n frames) per effect"""
+        return [(effect.name, effect.cost_ms, effect.budget_ms, effect.every) for effect in self.effects]
+
+
+def escape_chain(seed=None, adaptive=True):
+    """The full-screen glitch over the escape crawl"""
+    return EffectChain([ChannelShift(12), ScanlineTear(8), BlockDisplace(6), Quantize()],
+                       seed=seed, adaptive=adaptive)
+
+
+def object_chain(seed=None, adaptive=True):
+    """The small glitch over a single object, such as the hologram key"""
+    return EffectChain([ChannelShift(4, budget_ms=0.5), ScanlineTear(3, max_height=6, max_offset=12, budget_ms=0.5),
+                        BlockDisplace(3, max_size=16, budget_ms=0.5)], seed=seed, adaptive=adaptive)
@@ -0,0 +1,308 @@
+"""Puzzle logic for the escape room, with no display and no rendering.
+
+GameState holds everything the puzzles depend on and advances it from
+simple input events. EscapeRoom draws on top of it; headless runs drive it
+directly with scripted events and a ManualClock, as fast as the CPU allows.
+
+Scripted events are tuples:
+    ('click', (x, y))     mouse click
+    ('hover', (x, y))     mouse moved
+    ('text', 'echo')      typed characters
+    ('enter',)            Enter key
+    ('backspace',)        Backspace key
+    ('wait', ms)          let time pass
+
+The pack is only opened when a game or one of the pack-derived helpers
+below first needs it, never on import.
+"""
+import functools
+import time
+
+import pygame
+
+from content import default_pack
+
+
+class ManualClock:
+    """Millisecond clock for headless runs that only moves when advanced"""
+    def __init__(self, start=0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, ms):
+        self.now += ms
+
+
+def _flag(name):
+    """Property exposing one state flag as a boolean attribute"""
+    def get(self):
+        return name in self.flags
+
+    def set(self, value):
+        if value:
+            self.flags.add(name)
+        else:
+            self.flags.discard(name)
+    return property(get, set)
+
+
+class GameState:
+    # Fixed attributes keep each state small; the session server holds thousands
+    __slots__ = ('clock', 'pack', 'current_room', 'escaped', 'revealed', 'notification_message',
+                 'sequence_input', 'input_active', 'user_input', 'mouse_pos', 'flags', 'timers')
+
+    # Progress flags of the bundled pack, as attributes
+    riddle_solved = _flag('riddle_solved')
+    key_found = _flag('key_found')
+    keypad_solved = _flag('keypad_solved')
+    door_unlocked = _flag('door_unlocked')
+    lion_head_appeared = _flag('lion_head_appeared')
+    key_is_hologram = _flag('key_is_hologram')
+
+    def __init__(self, clock=None, pack=None):
+        # Milliseconds since start; the real game uses pygame's ticks
+        self.clock = clock if clock is not None else pygame.time.get_ticks
+
+        # Rooms, objects and puzzles come from a content pack
+        self.pack = pack if pack is not None else default_pack()
+
+        # Game State
+        self.current_room = self.pack.start_room
+        self.escaped = False
+        self.revealed = False
+        self.notification_message = ""
+        self.sequence_input = []
+        self.input_active = False
+        self.user_input = ""
+        self.mouse_pos = (-1, -1)
+        self.flags = set()
+        self.timers = {}
+
+    @property
+    def room(self):
+        """The current room's definition"""
+        return self.pack.room(self.current_room)
+
+    @property
+    def finished(self):
+        """True once the player has escaped or the plot twist has started"""
+        return self.escaped or self.revealed
+
+    def visible(self, obj, flags=None):
+        """True unless the object only shows once a flag is set (in flags, or else the game's)"""
+        return 'visible_if' not in obj or obj['visible_if'] in (self.flags if flags is None else flags)
+
+    def handle(self, event):
+        """Apply one scripted input event"""
+        kind = event[0]
+        if kind == 'click':
+            self.click(event[1])
+        elif kind == 'hover':
+            self.mouse_pos = event[1]
+        elif kind == 'text':
+            self.type_text(event[1])
+        elif kind == 'enter':
+            self.submit()
+        elif kind == 'backspace':
+            self.backspace()
+        elif kind == 'wait':
+            self.clock.advance(event[1])
+        else:
+            raise ValueError("Unknown input event: %r" % (event,))
+
+    def update(self, mouse_pos=None):
+        """Per-frame logic that depends on where the mouse is and on time"""
+        if mouse_pos is not None:
+            self.mouse_pos = mouse_pos
+        room = self.room
+        for _, actions in room.registry.hovers.query(self.mouse_pos):
+            self.run(actions)
+
+        # Timed events such as the plot twist reveal
+        for timer in room.timers:
+            if (timer['flag'] in self.flags
+                    and self.clock() - self.timers.get(timer['timer'], 0) > timer['after_ms']):
+                self.run(timer['then'])
+
+    def click(self, mouse_pos):
+        """Handle a mouse click at mouse_pos"""
+        self.mouse_pos = mouse_pos
+        for _, actions in self.room.registry.clicks.query(mouse_pos):
+            self.run(actions)
+
+    def run(self, actions):
+        """Apply a list of actions from the room definition"""
+        for action in actions:
+            if 'say' in action:
+                self.notification_message = action['say']
+            elif 'prompt' in action:
+                puzzle = self.room.puzzles[action['prompt']]
+                if puzzle['flags'][0] in self.flags:
+                    self.run(action.get('else', []))
+                else:
+                    self.notification_message = puzzle['prompt']
+                    self.input_active = True
+            elif 'push' in action:
+                self.sequence_input.append(action['push'])
+            elif 'check_sequence' in action:
+                puzzle = self.room.puzzles[action['check_sequence']]
+                if self.sequence_input == puzzle['answer']:
+                    self.notification_message = puzzle['solved']
+                elif len(self.sequence_input) > len(puzzle['answer']):
+                    self.notification_message = puzzle['wrong']
+                    self.sequence_input = []
+            elif 'set' in action:
+                self.flags.add(action['set'])
+            elif 'start_timer' in action:
+                self.timers[action['start_timer']] = self.clock()
+            elif 'goto' in action:
+                self.current_room = action['goto']
+            elif 'escape' in action:
+                self.escaped = True
+            elif 'reveal' in action:
+                self.revealed = True
+            else:
+                raise ValueError("Unknown action: %r" % (action,))
+
+    def type_text(self, text):
+        """Append typed characters to the input box"""
+        if self.input_active:
+            self.user_input += text
+
+    def backspace(self):
+        """Delete the last typed character"""
+        if self.input_active:
+            self.user_input = self.user_input[:-1]
+
+    def submit(self):
+        """Check the typed answer against the puzzle the notification is asking"""
+        if not self.input_active:
+            return
+        self.input_active = False
+        for puzzle in self.room.puzzles.values():
+            if puzzle.get('type') != 'answer':
+                continue
+            match = puzzle['match']
+            message = self.notification_message
+            if puzzle.get('match_ignore_case'):
+                match, message = match.lower(), message.lower()
+            if match not in message:
+                continue
+            answer = self.user_input.lower() if puzzle.get('ignore_case') else self.user_input
+            if answer == puzzle['answer']:
+                self.flags.update(puzzle['flags'])
+                self.notification_message = puzzle['solved']
+            else:
+                self.notification_message = puzzle['wrong']
+            break
+        self.user_input = ""
+
+
+def run_headless(events, state=None, max_steps=None):
+    """Play scripted events against a headless GameState.
+
+    Each event is one step, followed by the per-frame update. Stops early
+    once the game is finished. Returns (state, steps).
+    """
+    if state is None:
+        state = GameState(clock=ManualClock())
+    steps = 0
+    for event in events:
+        if state.finished or (max_steps is not None and steps >= max_steps):
+            break
+        state.handle(event)
+        state.update()
+        steps += 1
+    return state, steps
+
+
+def hotspot(room, object_id):
+    """A point that hits only this object: its center, or the nearest point clear of the others"""
+    rect = room.object(object_id)['rect']
+    others = [obj['rect'] for obj in room.objects if obj['id'] != object_id and obj['rect'] is not None
+              and ('click' in obj or 'hover' in obj)]
+    points = [rect.center] + sorted(
+        ((x, y) for x in range(rect.left, rect.right, 5) for y in range(rect.top, rect.bottom, 5)),
+        key=lambda p: (p[0] - rect.centerx) ** 2 + (p[1] - rect.centery) ** 2)
+    for point in points:
+        if not any(other.collidepoint(point) for other in others):
+            return point
+    return rect.center
+
+
+@functools.lru_cache(maxsize=None)
+def hotspots(pack=None):
+    """One hotspot per interactive object in every room, without repeats"""
+    pack = pack if pack is not None else default_pack()
+    points = []
+    for room_id in sorted(pack.index):
+        room = pack.room(room_id)
+        for obj in room.objects:
+            if obj['rect'] is not None and ('click' in obj or 'hover' in obj):
+                point = hotspot(room, obj['id'])
+                if point not in points:
+                    points.append(point)
+    return tuple(points)
+
+
+def timer_ms(name, pack=None):
+    """How long a timer in the pack runs before it fires"""
+    pack = pack if pack is not None else default_pack()
+    for room_id in sorted(pack.index):
+        for timer in pack.room(room_id).timers:
+            if timer['timer'] == name:
+                return timer['after_ms']
+    raise KeyError(name)
+
+
+@functools.lru_cache(maxsize=None)
+def hologram_reveal_ms():
+    """How long the key has to be left alone before the plot twist starts"""
+    return timer_ms('hologram')
+
+
+@functools.lru_cache(maxsize=None)
+def key_hotspot():
+    """Where to touch the key in the last room"""
+    return hotspot(default_pack().room(3), 'key_item')
+
+
+@functools.lru_cache(maxsize=None)
+def solution():
+    """A full playthrough of the bundled pack that reaches the plot twist"""
+    pack = default_pack()
+    box = hotspot(pack.room(1), 'box')
+    door = hotspot(pack.room(1), 'door')
+    device = hotspot(pack.room(2), 'puzzle_device')
+    return (
+        ('click', box),             # box -> riddle
+        ('text', 'echo'),
+        ('enter',),
+        ('click', door),            # door -> keypad
+        ('text', '1234'),
+        ('enter',),
+        ('click', door),            # door -> room 2
+        ('click', device),          # puzzle device -> lion head
+        ('click', door),            # door -> room 3
+        ('hover', key_hotspot()),   # touch the key
+        ('hover', (10, 10)),
+        ('wait', hologram_reveal_ms() + 1),
+    )
+
+
+def main(runs=20000):
+    start = time.perf_counter()
+    steps = 0
+    for _ in range(runs):
+        state, taken = run_headless(solution())
+        assert state.revealed, state.notification_message
+        steps += taken
+    elapsed = time.perf_counter() - start
+    print("%d playthroughs, %d steps in %.2f s (%.0f steps/s)" % (
+        runs, steps, elapsed, steps / elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""Frame-time profiler for the game loop.
+
+FrameProfiler times named phases of each frame into a fixed-size ring
+buffer and can draw an overlay with FPS, frame-time percentiles and the most
+expensive phases. When it is disabled, phase() hands back a shared no-op
+context and nothing is recorded, so leaving the calls in the loop is free.
+
+Phases and instrumented calls can nest. Each records only its own time,
+without the phases inside it, so no time is counted twice and a frame's
+phases add up to at most its frame time.
+"""
+import csv
+import json
+import threading
+import time
+from array import array
+
+import pygame
+
+
+class _NullPhase:
+    """No-op timing context used while profiling is off"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_PHASE = _NullPhase()
+
+
+class _Phase:
+    """Times one named phase and adds it to the current frame"""
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.close(self.name)
+        return False
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class FrameProfiler:
+    def __init__(self, capacity=600):
+        self.capacity = capacity
+        self.enabled = False
+        self.overlay = False
+
+        # Ring buffers, one slot per frame
+        self.frame_ms = array('d', bytes(8 * capacity))
+        self.interval_ms = array('d', bytes(8 * capacity))
+        self.phase_ms = {}
+        self.count = 0
+
+        self.current = {}
+        self.phases = {}
+        # [start, ms spent in nested phases] for each open phase, innermost last
+        self.open_phases = []
+        self.frame_start = 0.0
+        self.last_start = None
+        self.instrumented = {}
+
+        # Current settings worth seeing next to the timings, e.g. quality level
+        self.tags = {}
+
+        # Work done outside the frame, e.g. on the room preloader thread:
+        # name -> [count, total ms, max ms]
+        self.background = {}
+        self.background_lock = threading.Lock()
+
+        # Overlay text is re-rendered a few times a second, not every frame
+        self.overlay_surface = None
+        self.overlay_time = 0.0
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+        self.last_start = None
+
+    def phase(self, name):
+        """Context manager timing one phase of the current frame"""
+        if not self.enabled:
+            return NULL_PHASE
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = _Phase(self, name)
+        return phase
+
+    def add(self, name, ms):
+        """Add time spent in a phase to the current frame, and not to the phase around it"""
+        self.current[name] = self.current.get(name, 0.0) + ms
+        if self.open_phases:
+            self.open_phases[-1][1] += ms
+
+    def open(self):
+        """Start timing a phase; close(name) records it"""
+        self.open_phases.append([time.perf_counter(), 0.0])
+
+    def close(self, name):
+        """Record the phase opened last, less the time of the phases inside it"""
+        start, nested = self.open_phases.pop()
+        self.add(name, (time.perf_counter() - start) * 1000 - nested)
+        if self.open_phases:
+            self.open_phases[-1][1] += nested
+
+    def note(self, name, ms):
+        """Record time spent outside the frame; safe to call from other threads"""
+        if not self.enabled:
+            return
+        with self.background_lock:
+            stats = self.background.setdefault(name, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += ms
+            stats[2] = max(stats[2], ms)
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if self.last_start is not None:
+            self.interval_ms[self.count % self.capacity] = (now - self.last_start) * 1000
+        self.last_start = now
+        self.frame_start = now
+        self.current.clear()
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+        slot = self.count % self.capacity
+        self.frame_ms[slot] = (time.perf_counter() - self.frame_start) * 1000
+        for name, ms in self.current.items():
+            if name not in self.phase_ms:
+                self.phase_ms[name] = array('d', bytes(8 * self.capacity))
+            self.phase_ms[name][slot] = ms
+        for name, buffer in self.phase_ms.items():
+            if name not in self.current:
+                buffer[slot] = 0.0
+        self.count += 1
+
+    def instrument(self, cls, names):
+        """Wrap static methods of cls so each call is timed as its own (nested) phase"""
+        for name in names:
+            if (cls, name) in self.instrumented:
+                continue
+            original = cls.__dict__[name]
+            self.instrumented[(cls, name)] = original
+            setattr(cls, name, staticmethod(self._timed(cls.__name__ + '.' + name, original.__func__)))
+
+    def uninstrument(self):
+        """Restore every method replaced by instrument()"""
+        for (cls, name), original in self.instrumented.items():
+            setattr(cls, name, original)
+        self.instrumented.clear()
+
+    def _timed(self, label, func):
+        def timed(*args, **kwargs):
+            if not self.enabled:
+                return func(*args, **kwargs)
+            self.open()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.close(label)
+        return timed
+
+    def _recent(self, buffer):
+        """Values in a ring buffer, oldest first"""
+        n = min(self.count, self.capacity)
+        if self.count <= self.capacity:
+            return list(buffer[:n])
+        slot = self.count % self.capacity
+        return list(buffer[slot:]) + list(buffer[:slot])
+
+    def summary(self, top=5):
+        frames = self._recent(self.frame_ms)
+        intervals = [ms for ms in self._recent(self.interval_ms) if ms > 0]
+        n = len(frames)
+        phases = {name: sum(self._recent(buffer)) / n for name, buffer in self.phase_ms.items()} if n else {}
+        return {
+            'frames': n,
+            'fps': 1000 * len(intervals) / sum(intervals) if intervals else 0.0,
+            'p50_ms': percentile(frames, 0.50),
+            'p95_ms': percentile(frames, 0.95),
+            'p99_ms': percentile(frames, 0.99),
+            'top_phases': sorted(phases.items(), key=lambda item: -item[1])[:top],
+            'background': self.background_summary(),
+            'tags': dict(self.tags),
+        }
+
+    def background_summary(self):
+        with self.background_lock:
+            return {name: {'count': count, 'mean_ms': total / count, 'max_ms': worst}
+                    for name, (count, total, worst) in sorted(self.background.items())}
+
+    def dump(self, path):
+        """Write the buffered frames to CSV or JSON, chosen by file extension"""
+        names = sorted(self.phase_ms)
+        frames = self._recent(self.frame_ms)
+        columns = [self._recent(self.phase_ms[name]) for name in names]
+        if path.endswith('.csv'):
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['frame', 'frame_ms'] + names)
+                for i, frame in enumerate(frames):
+                    writer.writerow([i, round(frame, 4)] + [round(column[i], 4) for column in columns])
+            return
+        with open(path, 'w') as f:
+            json.dump({
+                'summary': self.summary(top=len(names)),
+                'phases': names,
+                'frames': [[round(frame, 4)] + [round(column[i], 4) for column in columns]
+                           for i, frame in enumerate(frames)],
+            }, f, indent=1)
+
+    def draw_overlay(self, surface, font, pos=(10, 10)):
+        """Draw FPS, frame-time percentiles and top phases; returns the drawn rect"""
+        now = time.perf_counter()
+        if self.overlay_surface is None or now - self.overlay_time > 0.25:
+            stats = self.summary()
+            lines = ["FPS %.1f   frame p50 %.2f  p95 %.2f  p99 %.2f ms" % (
+                stats['fps'], stats['p50_ms'], stats['p95_ms'], stats['p99_ms'])]
+            if self.tags:
+                lines[0] += "   " + "  ".join("%s %s" % item for item in sorted(self.tags.items()))
+            for name, ms in stats['top_phases']:
+                lines.append("%-36s %6.2f ms" % (name, ms))
+            for name, note in stats['background'].items():
+                lines.append("%-36s %6.2f ms  max %.2f  (x%d, background)" % (
+                    name, note['mean_ms'], note['max_ms'], note['count']))
+            rendered = [font.render(line, True, (0, 255, 0)) for line in lines]
+            width = max(text.get_width() for text in rendered) + 10
+            height = sum(text.get_height() for text in rendered) + 10
+            self.overlay_surface = pygame.Surface((width, height))
+            self.overlay_surface.set_alpha(200)
+            y = 5
+            for text in rendered:
+                self.overlay_surface.blit(text, (5, y))
+                y += text.get_height()
+            self.overlay_time = now
+        return surface.blit(self.overlay_surface, pos)
@@ -0,0 +1,128 @@
+"""Adaptive effect quality for slow machines.
+
+The frame pacer only caps the frame rate; on a slow machine frames simply
+run long. QualityController watches how long recent frames took to draw and
+steps the effect detail down a level when they go over budget, and back up
+once there is clear headroom again. Each level sets the background noise
+cell size, how many glitch squares the overlays scatter, a cap on the
+background refresh rate and how far the escape crawl text jitters.
+
+Stepping down needs a full window of frames over budget, stepping up a
+longer run well under it, and a level that turns out too slow right after
+stepping up doubles the wait before the next try, so the level settles
+instead of flipping back and forth.
+"""
+import json
+import time
+from array import array
+
+# Lowest quality first
+QUALITY_LEVELS = [
+    # name, noise cell px, glitch square fraction, background refresh cap (Hz), crawl jitter fraction
+    {'name': 'minimal', 'noise_cell': 80, 'glitch': 0.1, 'background_hz': 5, 'jitter': 0.25},
+    {'name': 'low', 'noise_cell': 40, 'glitch': 0.3, 'background_hz': 15, 'jitter': 0.5},
+    {'name': 'reduced', 'noise_cell': 20, 'glitch': 0.6, 'background_hz': 30, 'jitter': 0.75},
+    {'name': 'full', 'noise_cell': 20, 'glitch': 1.0, 'background_hz': None, 'jitter': 1.0},
+]
+
+QUALITY_NAMES = [level['name'] for level in QUALITY_LEVELS]
+
+DOWNGRADE_AT = 1.0      # mean frame time over the budget: step down
+UPGRADE_AT = 0.6        # mean frame time under 60% of the budget: step up
+MAX_HOLD_WINDOWS = 32   # longest wait before retrying a level, in windows
+
+
+def quality_level(name):
+    """Index of a quality level by name"""
+    return QUALITY_NAMES.index(name)
+
+
+class QualityController:
+    """Picks a quality level from the time recent frames took.
+
+    Frame times are the work done in a frame, without the time spent waiting
+    for the pacer. With adaptive=False the level never changes on its own.
+    Level changes can be appended as JSON lines to log_path.
+    """
+    def __init__(self, level=None, adaptive=True, budget_ms=1000 / 60, window=30, log_path=None):
+        self.level = len(QUALITY_LEVELS) - 1 if level is None else level
+        self.adaptive = adaptive
+        self.budget_ms = budget_ms
+        self.window = window
+
+        # Ring buffer of recent frame times
+        self.times = array('d', bytes(8 * window))
+        self.frame = 0
+        self.frames_at_level = 0
+
+        # Frames of headroom needed before stepping up; doubles after a failed try
+        self.hold = 4 * window
+        self.stepped_up = False
+        self.changes = 0
+        self.mean_ms = 0.0
+
+        self.log = open(log_path, 'a') if log_path else None
+
+    @property
+    def name(self):
+        return QUALITY_NAMES[self.level]
+
+    @property
+    def settings(self):
+        return QUALITY_LEVELS[self.level]
+
+    def add(self, frame_ms):
+        """Record one frame's time; returns True if the level changed"""
+        self.times[self.frame % self.window] = frame_ms
+        self.frame += 1
+        self.frames_at_level += 1
+        if not self.adaptive or self.frames_at_level < self.window:
+            return False
+
+        # A step up that held for a whole hold period counts as settled
+        base_hold = 4 * self.window
+        if self.stepped_up and self.frames_at_level >= self.hold:
+            self.stepped_up = False
+            self.hold = base_hold
+
+        self.mean_ms = sum(self.times) / self.window
+        if self.mean_ms > self.budget_ms * DOWNGRADE_AT and self.level > 0:
+            if self.stepped_up:
+                self.hold = min(self.hold * 2, MAX_HOLD_WINDOWS * self.window)
+            self.stepped_up = False
+            self.set_level(self.level - 1)
+            return True
+        if (self.mean_ms < self.budget_ms * UPGRADE_AT and self.level < len(QUALITY_LEVELS) - 1
+                and self.frames_at_level >= self.hold):
+            self.stepped_up = True
+            self.set_level(self.level + 1)
+            return True
+        return False
+
+    def set_level(self, level):
+        """Switch to a level and start measuring it afresh"""
+        if level == self.level:
+            return
+        self.level = level
+        self.frames_at_level = 0
+        self.changes += 1
+        if self.log is not None:
+            self.log.write(json.dumps(self.state()) + '\n')
+            self.log.flush()
+
+    def state(self):
+        """Current level and the measurement behind it, for logging"""
+        return {
+            'time': round(time.time(), 3),
+            'frame': self.frame,
+            'level': self.level,
+            'quality': self.name,
+            'mean_ms': round(self.mean_ms, 3),
+            'budget_ms': round(self.budget_ms, 3),
+            'changes': self.changes,
+        }
+
+    def close(self):
+        if self.log is not None:
+            self.log.close()
+            self.log = None
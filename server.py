@@ -0,0 +1,202 @@
+"""Headless multi-session server for the escape room puzzles.
+
+One process hosts many players at once. Each session is a bare GameState
+(fixed __slots__, no Surface, no fonts) sharing the loaded content pack, so
+a session costs a few hundred bytes and a request a few tens of
+microseconds. Clients send one JSON object per line over TCP and get one
+line back for each, in order. A connection can drive any number of
+sessions, and requests can be pipelined:
+
+    {"op": "open"}                          -> {"session": 1, "state": {...}}
+    {"op": "event", "session": 1, "event": ["click", [200, 500]]}
+                                            -> {"session": 1, "diff": {...}}
+    {"op": "poll", "session": 1}            -> {"session": 1, "diff": {...}}
+    {"op": "close", "session": 1}           -> {"session": 1, "closed": true}
+    {"op": "stats"}                         -> {"sessions": ..., "requests": ...}
+
+Events are the scripted events of game_state.py except "wait"; time is the
+server's clock. "state" is the whole visible state (room, message, input
+box, flags, outcome) and "diff" only the fields a request changed. Timers
+such as the hologram reveal are checked on every request, so a client
+waiting on one sends "poll". Sessions close with the connection that
+opened them. Errors come back as {"error": text}.
+
+    python server.py --port 8765
+    python benchmarks/bench_server.py --sessions 2000
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from content import DEFAULT_PACK, load_pack
+from game_state import GameState
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Scripted events a remote player may send
+EVENTS = {'click', 'hover', 'text', 'enter', 'backspace'}
+
+# Pointer coordinates outside this range are rejected (JSON also allows Infinity and NaN)
+MAX_COORDINATE = 2 ** 31
+
+# Pause reading a client while this much output is waiting to be sent
+WRITE_HIGH_WATER = 64 * 1024
+
+
+def server_clock():
+    """Milliseconds on a monotonic clock, shared by every session"""
+    return int(time.monotonic() * 1000)
+
+
+def snapshot(state):
+    """The part of a session's state a client can see"""
+    return {
+        'room': state.current_room,
+        'message': state.notification_message,
+        'input_active': state.input_active,
+        'input': state.user_input,
+        'flags': sorted(state.flags),
+        'escaped': state.escaped,
+        'revealed': state.revealed,
+    }
+
+
+def diff(before, after):
+    return {key: value for key, value in after.items() if before[key] != value}
+
+
+def parse_event(event):
+    """JSON event list -> scripted event tuple, or ValueError"""
+    if not isinstance(event, list) or not event or event[0] not in EVENTS:
+        raise ValueError("Unknown event: %r" % (event,))
+    kind = event[0]
+    if len(event) != (2 if kind in ('click', 'hover', 'text') else 1):
+        raise ValueError("Wrong number of arguments for %s: %r" % (kind, event))
+    if kind in ('click', 'hover'):
+        x, y = event[1]
+        for value in (x, y):
+            if (isinstance(value, bool) or not isinstance(value, (int, float))
+                    or not -MAX_COORDINATE < value < MAX_COORDINATE):
+                raise ValueError("Coordinates must be finite numbers: %r" % (event,))
+        return (kind, (int(x), int(y)))
+    if kind == 'text':
+        return (kind, str(event[1]))
+    return (kind,)
+
+
+class SessionServer:
+    """Every open session, and the request handling for them"""
+    def __init__(self, pack=None, clock=server_clock, max_sessions=None):
+        # Sessions are spread over every room, so keep them all resident
+        self.pack = pack if pack is not None else load_pack(DEFAULT_PACK, max_rooms=None)
+        self.clock = clock
+        self.max_sessions = max_sessions
+        self.sessions = {}
+        self.next_id = 1
+        self.requests = 0
+
+    def open(self):
+        if self.max_sessions is not None and len(self.sessions) >= self.max_sessions:
+            raise ValueError("Session limit reached")
+        session_id = self.next_id
+        self.next_id += 1
+        self.sessions[session_id] = GameState(clock=self.clock, pack=self.pack)
+        return session_id
+
+    def handle(self, request, owned):
+        """Answer one request; owned is the set of sessions of the calling connection"""
+        self.requests += 1
+        try:
+            op = request['op']
+            if op == 'open':
+                session_id = self.open()
+                owned.add(session_id)
+                return {'session': session_id, 'state': snapshot(self.sessions[session_id])}
+            if op == 'stats':
+                return self.stats()
+
+            session_id = request['session']
+            if session_id not in owned:
+                raise ValueError("No such session: %r" % (session_id,))
+            state = self.sessions[session_id]
+            if op == 'close':
+                owned.discard(session_id)
+                del self.sessions[session_id]
+                return {'session': session_id, 'closed': True}
+
+            before = snapshot(state)
+            if op == 'event':
+                event = parse_event(request['event'])
+                if not state.finished:
+                    state.handle(event)
+            elif op != 'poll':
+                raise ValueError("Unknown op: %r" % (op,))
+            if not state.finished:
+                state.update()
+            return {'session': session_id, 'diff': diff(before, snapshot(state))}
+        except (KeyError, TypeError, ValueError) as e:
+            return {'error': '%s: %s' % (type(e).__name__, e)}
+
+    def stats(self):
+        stats = {'sessions': len(self.sessions), 'requests': self.requests}
+        if resource is not None:
+            stats['max_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return stats
+
+    async def serve_client(self, reader, writer):
+        owned = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    response = {'error': 'Request is not JSON'}
+                else:
+                    response = self.handle(request, owned) if isinstance(request, dict) else {
+                        'error': 'Request is not an object'}
+                writer.write(json.dumps(response, separators=(',', ':')).encode('utf-8') + b'\n')
+                if writer.transport.get_write_buffer_size() > WRITE_HIGH_WATER:
+                    await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            for session_id in owned:
+                self.sessions.pop(session_id, None)
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8765, ready=None):
+        """Serve until cancelled; ready(port) is called once listening"""
+        server = await asyncio.start_server(self.serve_client, host, port)
+        async with server:
+            if ready is not None:
+                ready(server.sockets[0].getsockname()[1])
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve headless escape room sessions over TCP")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765, help="0 picks a free port")
+    parser.add_argument('--max-sessions', type=int, default=None)
+    args = parser.parse_args()
+
+    server = SessionServer(max_sessions=args.max_sessions)
+
+    def ready(port):
+        print("listening on %s:%d" % (args.host, port), flush=True)
+
+    try:
+        asyncio.run(server.serve(args.host, args.port, ready))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
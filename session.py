@@ -0,0 +1,279 @@
+"""Recording and deterministic replay of game sessions.
+
+The game loop takes its input through an input source: the clock, the
+mouse position, the events of each frame and the pacing between frames.
+LiveInput reads them from pygame. SessionRecorder does the same and also
+appends them to a compact binary log. SessionPlayer feeds a log back, with
+the recorded seed and options, so the game draws the same frames again.
+It can replay as fast as possible or at the recorded pace, and under the
+profiler.
+
+    python Escaperoom.py --record session.qgs
+    python Escaperoom.py --replay session.qgs --replay-speed max --profile slow.json
+
+Log layout: MAGIC, a length-prefixed JSON header (seed, game options) and
+then a stream of records, each a one-byte tag and a fixed struct:
+    F  frame number, clock ms, mouse x, mouse y   (starts a frame)
+    M  mouse button down: x, y, button
+    K  key down: key, length + UTF-8 text
+    Q  quit
+    C  CRC-32 of the finished frame (only with checksums on)
+    L  effect quality level, whenever it changes
+The file is only ever appended to. A log cut short by a crash replays up
+to its last whole record.
+"""
+import json
+import struct
+import time
+import zlib
+
+import pygame
+
+MAGIC = b'QGSESS1\n'
+
+FRAME = b'F'
+MOUSE = b'M'
+KEY = b'K'
+QUIT = b'Q'
+CHECKSUM = b'C'
+LEVEL = b'L'
+
+_FRAME = struct.Struct('<IIhh')
+_MOUSE = struct.Struct('<hhB')
+_KEY = struct.Struct('<iB')
+_CHECKSUM = struct.Struct('<I')
+_LEVEL = struct.Struct('<B')
+
+
+def frame_checksum(surface):
+    """CRC-32 of a surface's pixels"""
+    try:
+        pixels = surface.get_view('2')
+    except ValueError:
+        # Subsurfaces are not contiguous
+        pixels = pygame.image.tobytes(surface, 'RGBA')
+    return zlib.crc32(pixels)
+
+
+class LiveInput:
+    """Input read straight from pygame, with frames paced to fps"""
+    # True when every frame has to come out the same on another run
+    deterministic = False
+    # True when quality levels come from the input rather than frame times
+    fixed_quality = False
+
+    def __init__(self, fps=60):
+        self.fps = fps
+        self.pacer = pygame.time.Clock()
+        self.frame = 0
+
+    def begin_frame(self):
+        pass
+
+    def clock(self):
+        return pygame.time.get_ticks()
+
+    def mouse_pos(self):
+        return pygame.mouse.get_pos()
+
+    def events(self):
+        return pygame.event.get()
+
+    def quality_level(self, level):
+        """The quality level to draw the next frame at, given the one the game picked"""
+        return level
+
+    def end_frame(self, surface):
+        self.frame += 1
+        self.pacer.tick(self.fps)
+
+    def close(self):
+        pass
+
+
+class SessionRecorder(LiveInput):
+    """Live input that is also appended to a session log.
+
+    The clock and mouse are sampled once at the start of each frame and
+    stay fixed during it, so a replay sees exactly what the frame saw.
+    """
+    deterministic = True
+
+    def __init__(self, path, seed, settings, checksums=False, fps=60):
+        LiveInput.__init__(self, fps)
+        self.now = 0
+        self.mouse = (0, 0)
+        self.checksums = checksums
+        self.level = None
+        self.buffer = bytearray()
+        self.file = open(path, 'wb')
+        header = json.dumps({'seed': seed, 'settings': settings, 'checksums': checksums}).encode('utf-8')
+        self.file.write(MAGIC + struct.pack('<I', len(header)) + header)
+
+    def begin_frame(self):
+        self.now = pygame.time.get_ticks()
+        self.mouse = pygame.mouse.get_pos()
+        self.buffer += FRAME + _FRAME.pack(self.frame, self.now, *self.mouse)
+
+    def clock(self):
+        return self.now
+
+    def mouse_pos(self):
+        return self.mouse
+
+    def events(self):
+        events = pygame.event.get()
+        for event in events:
+            if event.type == pygame.MOUSEBUTTONDOWN:
+                self.buffer += MOUSE + _MOUSE.pack(event.pos[0], event.pos[1], event.button)
+            elif event.type == pygame.KEYDOWN:
+                text = event.unicode.encode('utf-8')[:255]
+                self.buffer += KEY + _KEY.pack(event.key, len(text)) + text
+            elif event.type == pygame.QUIT:
+                self.buffer += QUIT
+                # The game exits straight after handling QUIT
+                self.flush()
+        return events
+
+    def quality_level(self, level):
+        if level != self.level:
+            self.buffer += LEVEL + _LEVEL.pack(level)
+            self.level = level
+        return level
+
+    def end_frame(self, surface):
+        if self.checksums:
+            self.buffer += CHECKSUM + _CHECKSUM.pack(frame_checksum(surface))
+        # Whole frames only, flushed about once a second
+        self.file.write(self.buffer)
+        self.buffer.clear()
+        if self.frame % self.fps == 0:
+            self.file.flush()
+        LiveInput.end_frame(self, surface)
+
+    def flush(self):
+        self.file.write(self.buffer)
+        self.buffer.clear()
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+
+def read_session(path):
+    """Return (header, frames) of a log; frames are [clock, mouse, events, checksum, quality level]"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError("Not a session log: %s" % path)
+    offset = len(MAGIC)
+    header_len, = struct.unpack_from('<I', data, offset)
+    offset += 4
+    header = json.loads(data[offset:offset + header_len].decode('utf-8'))
+    offset += header_len
+
+    frames = []
+    try:
+        while offset < len(data):
+            tag = data[offset:offset + 1]
+            offset += 1
+            if tag == FRAME:
+                _, now, x, y = _FRAME.unpack_from(data, offset)
+                offset += _FRAME.size
+                frames.append([now, (x, y), [], None, None])
+            elif tag == MOUSE:
+                x, y, button = _MOUSE.unpack_from(data, offset)
+                offset += _MOUSE.size
+                frames[-1][2].append((pygame.MOUSEBUTTONDOWN, {'pos': (x, y), 'button': button}))
+            elif tag == KEY:
+                key, length = _KEY.unpack_from(data, offset)
+                offset += _KEY.size
+                text = data[offset:offset + length]
+                if len(text) < length:
+                    break
+                offset += length
+                frames[-1][2].append((pygame.KEYDOWN, {'key': key, 'unicode': text.decode('utf-8'), 'mod': 0}))
+            elif tag == QUIT:
+                frames[-1][2].append((pygame.QUIT, {}))
+            elif tag == CHECKSUM:
+                frames[-1][3], = _CHECKSUM.unpack_from(data, offset)
+                offset += _CHECKSUM.size
+            elif tag == LEVEL:
+                frames[-1][4], = _LEVEL.unpack_from(data, offset)
+                offset += _LEVEL.size
+            else:
+                raise ValueError("Corrupt session log at byte %d" % (offset - 1))
+    except struct.error:
+        # Log cut off in the middle of a record
+        pass
+    return header, frames
+
+
+class SessionPlayer:
+    """Replays a session log as the game's input source.
+
+    With realtime=True frames are spaced as they were recorded, otherwise
+    they run back to back. After the last frame the player asks the game to
+    quit. Recorded frame checksums are compared as the frames are drawn, and
+    the game is held to the recorded quality levels whatever its frame times.
+    """
+    deterministic = True
+    fixed_quality = True
+
+    def __init__(self, path, realtime=False):
+        header, self.frames = read_session(path)
+        self.seed = header['seed']
+        self.settings = header['settings']
+        self.realtime = realtime
+        self.frame = -1
+        self.current = [0, (0, 0), [], None, None]
+        self.level = None
+        self.start = None
+        self.mismatches = []
+
+    def begin_frame(self):
+        self.frame += 1
+        if self.frame >= len(self.frames):
+            # Out of log: keep the last clock and quit
+            self.current = [self.current[0], self.current[1], [(pygame.QUIT, {})], None, None]
+            return
+        self.current = self.frames[self.frame]
+        if self.current[4] is not None:
+            self.level = self.current[4]
+        if self.realtime:
+            if self.start is None:
+                self.start = time.perf_counter() - self.current[0] / 1000
+            delay = self.start + self.current[0] / 1000 - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    def clock(self):
+        return self.current[0]
+
+    def mouse_pos(self):
+        return self.current[1]
+
+    def events(self):
+        return [pygame.event.Event(kind, attrs) for kind, attrs in self.current[2]]
+
+    def quality_level(self, level):
+        return level if self.level is None else self.level
+
+    def end_frame(self, surface):
+        checksum = self.current[3]
+        if checksum is not None and frame_checksum(surface) != checksum:
+            self.mismatches.append(self.frame)
+
+    def close(self):
+        pass
+
+    def report(self):
+        replayed = min(self.frame + 1, len(self.frames))
+        line = "replayed %d of %d frames" % (replayed, len(self.frames))
+        if any(frame[3] is not None for frame in self.frames):
+            line += ", %d checksum mismatches" % len(self.mismatches)
+            if self.mismatches:
+                line += " (first at frame %d)" % self.mismatches[0]
+        return line
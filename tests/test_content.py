@@ -0,0 +1,56 @@
+"""Room packs: least recently used rooms are dropped, broken packs are compiled again.
+
+    python -m unittest discover tests
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from content import DEFAULT_PACK, load_pack
+
+
+class ContentPackTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.source = os.path.join(self.directory, os.path.basename(DEFAULT_PACK))
+        shutil.copy(DEFAULT_PACK, self.source)
+        self.pack_path = os.path.splitext(self.source)[0] + '.pack'
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def open(self, **kwargs):
+        pack = load_pack(self.source, **kwargs)
+        self.addCleanup(pack.stream.close)
+        return pack
+
+    def test_recently_used_room_stays(self):
+        pack = self.open(max_rooms=2)
+        first, second, third = list(pack.index)[:3]
+        pack.room(first)
+        pack.room(second)
+        pack.room(first)
+        pack.room(third)
+        self.assertEqual(list(pack.loaded), [first, third])
+
+    def test_broken_pack_is_compiled_again(self):
+        self.open().stream.close()
+        with open(self.pack_path, 'rb') as f:
+            good = f.read()
+        for broken in (good[:3], good[:20], good[:len(good) // 2], good[:-1],
+                       good[:8] + b'\xff' * 16 + good[24:]):
+            with open(self.pack_path, 'wb') as f:
+                f.write(broken)
+            pack = self.open()
+            for room_id in pack.index:
+                pack.room(room_id)
+            with open(self.pack_path, 'rb') as f:
+                self.assertEqual(f.read(), good)
+
+
+if __name__ == "__main__":
+    unittest.main()
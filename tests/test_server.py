@@ -0,0 +1,71 @@
+"""Malformed requests get an error back and leave the connection and its sessions alone.
+
+    python -m unittest discover tests
+"""
+import asyncio
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from server import SessionServer
+
+MALFORMED_EVENTS = [
+    ['click'],
+    ['hover'],
+    ['text'],
+    ['click', [1]],
+    ['click', 'ab'],
+    ['click', [1, 2], 3],
+    ['click', [float('inf'), 0]],
+    ['hover', [0, float('-inf')]],
+    ['click', [float('nan'), 0]],
+    ['click', [10 ** 400, 0]],
+    ['click', ['1', '2']],
+    ['enter', 1],
+    [],
+    'click',
+    ['jump'],
+]
+
+
+class MalformedEventTest(unittest.TestCase):
+    def test_handle_returns_error(self):
+        server = SessionServer()
+        owned = set()
+        session = server.handle({'op': 'open'}, owned)['session']
+        for event in MALFORMED_EVENTS:
+            response = server.handle({'op': 'event', 'session': session, 'event': event}, owned)
+            self.assertIn('error', response, event)
+        self.assertEqual(len(server.sessions), 1)
+        response = server.handle({'op': 'event', 'session': session, 'event': ['click', [200, 500]]}, owned)
+        self.assertNotIn('error', response)
+
+    def test_connection_survives(self):
+        async def run():
+            server = SessionServer()
+            listener = await asyncio.start_server(server.serve_client, '127.0.0.1', 0)
+            port = listener.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+
+            async def request(message):
+                writer.write(json.dumps(message).encode('utf-8') + b'\n')
+                return json.loads(await reader.readline())
+
+            first = (await request({'op': 'open'}))['session']
+            second = (await request({'op': 'open'}))['session']
+            for event in MALFORMED_EVENTS:
+                self.assertIn('error', await request({'op': 'event', 'session': first, 'event': event}))
+            self.assertEqual(len(server.sessions), 2)
+            self.assertIn('diff', await request({'op': 'poll', 'session': second}))
+
+            writer.close()
+            listener.close()
+            await listener.wait_closed()
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    unittest.main()